@@ -0,0 +1,164 @@
+"""Read-only, memory-mapped product catalog for the highest-traffic barcodes.
+
+File layout (little-endian):
+
+    header   magic b"INGCAT01", uint32 version, uint32 count,
+             uint64 keys offset, uint64 offsets offset, uint64 lengths offset,
+             uint64 records offset
+    keys     count x uint64, sorted numeric barcode keys
+    offsets  count x uint64, record start relative to the records offset
+    lengths  count x uint32, record length in bytes
+    records  compact JSON product records
+
+Every worker maps the same file, so N uvicorn workers share one copy through
+the page cache. Lookups are a binary search over the mapped keys followed by
+a single record decode.
+"""
+import json
+import logging
+import mmap
+import os
+import shutil
+import struct
+import tempfile
+from pathlib import Path
+from typing import Any, Dict, Iterable, Optional, Tuple
+
+import numpy as np
+
+import fastjson
+from local_store import barcode_key
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"INGCAT01"
+VERSION = 1
+HEADER = struct.Struct("<8sII4Q")
+
+# Fields kept in catalog records; everything the scan path needs to build a ProductInfo
+RECORD_FIELDS = ("name", "brand", "ingredients", "image_url", "certifications")
+
+# Source of the placeholder product saved when no lookup found a barcode
+PLACEHOLDER_SOURCE = "Generated"
+
+def numeric_key(barcode: str) -> Optional[int]:
+    """Map a barcode to its catalog key (GTINs are at most 14 digits, so they fit in uint64)"""
+    key = barcode_key(barcode)
+    if not key or len(key) > 19:
+        return None
+    return int(key)
+
+class ProductCatalog:
+    """Memory-mapped view of a catalog file"""
+
+    def __init__(self, path: str):
+        self.path = str(path)
+        with open(self.path, "rb") as handle:
+            self._mmap = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count, keys_offset, offsets_offset, lengths_offset, records_offset = \
+            HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or version != VERSION:
+            self._mmap.close()
+            raise ValueError(f"{self.path} is not a version {VERSION} product catalog")
+
+        self.count = count
+        self._records_offset = records_offset
+        # Zero-copy views over the mapping
+        self._keys = np.frombuffer(self._mmap, dtype="<u8", count=count, offset=keys_offset)
+        self._offsets = np.frombuffer(self._mmap, dtype="<u8", count=count, offset=offsets_offset)
+        self._lengths = np.frombuffer(self._mmap, dtype="<u4", count=count, offset=lengths_offset)
+
+    def get(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Return the catalog record for a barcode, if present"""
+        key = numeric_key(barcode)
+        if key is None or not self.count:
+            return None
+        index = int(self._keys.searchsorted(np.uint64(key)))
+        if index >= self.count or int(self._keys[index]) != key:
+            return None
+        start = self._records_offset + int(self._offsets[index])
+        return fastjson.loads(self._mmap[start:start + int(self._lengths[index])])
+
+    def close(self) -> None:
+        # Release the numpy views before unmapping
+        self._keys = self._offsets = self._lengths = None
+        self._mmap.close()
+
+def write_catalog(path: str, records: Iterable[Tuple[str, Dict[str, Any]]]) -> int:
+    """Write (barcode, product) pairs to a catalog file, replacing it atomically
+
+    Records are streamed to a spool file as they arrive and only the key index
+    is held in memory. Later duplicates of a barcode are ignored, so pass the
+    preferred record first.
+    """
+    keys, offsets, lengths = [], [], []
+    seen = set()
+    position = 0
+
+    Path(path).parent.mkdir(parents=True, exist_ok=True)
+    with tempfile.TemporaryFile(dir=Path(path).parent) as spool:
+        for barcode, product in records:
+            key = numeric_key(barcode)
+            if key is None or key in seen:
+                continue
+            seen.add(key)
+            record = {field: product.get(field) for field in RECORD_FIELDS}
+            record["source"] = "Catalog"
+            blob = json.dumps(record, separators=(",", ":")).encode("utf-8")
+            spool.write(blob)
+            keys.append(key)
+            offsets.append(position)
+            lengths.append(len(blob))
+            position += len(blob)
+
+        order = np.argsort(np.asarray(keys, dtype="<u8"), kind="stable")
+        count = len(keys)
+        keys_offset = HEADER.size
+        offsets_offset = keys_offset + 8 * count
+        lengths_offset = offsets_offset + 8 * count
+        records_offset = lengths_offset + 4 * count
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as handle:
+            handle.write(HEADER.pack(MAGIC, VERSION, count, keys_offset, offsets_offset, lengths_offset, records_offset))
+            handle.write(np.asarray(keys, dtype="<u8")[order].tobytes())
+            handle.write(np.asarray(offsets, dtype="<u8")[order].tobytes())
+            handle.write(np.asarray(lengths, dtype="<u4")[order].tobytes())
+            spool.seek(0)
+            shutil.copyfileobj(spool, handle)
+    # Workers that already mapped the old file keep reading its inode
+    os.replace(tmp_path, path)
+    return count
+
+def iter_catalog_products(db, limit: Optional[int] = None) -> Iterable[Tuple[str, Dict[str, Any]]]:
+    """Yield the product cache entry per barcode, most-scanned barcodes first
+
+    `db` is a synchronous pymongo database. Every scan inserts a product
+    document, so the number of documents per barcode is its scan count.
+    Records come from the product cache, which the server keeps refreshing
+    (catalog hits queue refreshes too), rather than from the scan documents:
+    scans served from the catalog are saved with source "Catalog", and
+    copying those would freeze a barcode at its first catalog record.
+    Barcodes without a cache entry, such as placeholders saved when a lookup
+    failed, are skipped.
+    """
+    pipeline = [
+        {"$match": {"barcode": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$barcode", "scans": {"$sum": 1}}},
+        {"$sort": {"scans": -1}},
+        {"$lookup": {"from": "product_cache", "localField": "_id", "foreignField": "barcode", "as": "cached"}},
+        {"$unwind": "$cached"},
+    ]
+    if limit:
+        pipeline.append({"$limit": limit})
+
+    for doc in db.products.aggregate(pipeline, allowDiskUse=True):
+        cached = doc["cached"]
+        yield doc["_id"], {**cached["product_info"], "certifications": cached.get("certifications")}
+
+def build_catalog_from_products(db, path: str, limit: Optional[int] = None) -> int:
+    """Build a catalog file from the product cache, ranked by the products collection"""
+    count = write_catalog(path, iter_catalog_products(db, limit))
+    logger.info(f"Wrote {count} products to catalog {path}")
+    return count
@@ -0,0 +1,39 @@
+"""JSON encoding and decoding with orjson when available.
+
+orjson parses upstream responses and stored records several times faster
+than the stdlib json module. It is optional; without it the stdlib is used
+with the same compact output.
+"""
+import json
+from datetime import date, datetime
+from typing import Any
+
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    orjson = None
+    ORJSON_AVAILABLE = False
+
+# Both orjson.JSONDecodeError and json.JSONDecodeError subclass ValueError
+JSONDecodeError = ValueError
+
+def loads(data: Any) -> Any:
+    """Parse JSON from bytes, bytearray, memoryview or str"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+def _default(obj: Any) -> Any:
+    # Match orjson's native RFC 3339 output for datetimes
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+def dumps(obj: Any) -> bytes:
+    """Serialize to compact UTF-8 JSON bytes; datetimes become ISO 8601 strings"""
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=_default).encode("utf-8")
@@ -0,0 +1,345 @@
+"""On-disk barcode store built from bulk product dumps.
+
+The store is a single SQLite file with one table per source, keyed by a
+normalized barcode, so lookups are a single primary-key read with no network
+access. Importers stream their input and commit progress alongside each batch
+so an interrupted import can be resumed.
+"""
+import csv
+import gzip
+import io
+import json
+import logging
+import re
+import sqlite3
+import sys
+import time
+import zipfile
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import fastjson
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 10000
+PROGRESS_LOG_SECONDS = 10.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS openfoodfacts_products (
+    barcode TEXT PRIMARY KEY,
+    record TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fdc_branded_foods (
+    gtin TEXT PRIMARY KEY,
+    record TEXT NOT NULL
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS fdc_food_descriptions (
+    fdc_id INTEGER PRIMARY KEY,
+    description TEXT,
+    publication_date TEXT
+);
+
+CREATE TABLE IF NOT EXISTS organic_operations (
+    name TEXT PRIMARY KEY
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS import_progress (
+    source TEXT PRIMARY KEY,
+    path TEXT NOT NULL,
+    rows_read INTEGER NOT NULL,
+    rows_imported INTEGER NOT NULL,
+    completed INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+"""
+
+# Field mapping shared by the live API lookups and the bulk importers
+def split_ingredients(ingredients_text: str) -> List[str]:
+    """Split an ingredients statement into individual ingredients"""
+    if not ingredients_text:
+        return []
+    return [ing.strip() for ing in re.split(r'[,;]', ingredients_text) if ing.strip()]
+
+def map_openfoodfacts_product(product: Dict[str, Any]) -> Dict[str, Any]:
+    """Map an OpenFoodFacts product (API or dump row) to our product info dict"""
+    ingredients_text = product.get("ingredients_text") or ""
+    return {
+        "name": product.get("product_name") or "Unknown Product",
+        "brand": product.get("brands", "").split(",")[0] if product.get("brands") else None,
+        "ingredients": split_ingredients(ingredients_text),
+        "image_url": product.get("image_url") or None,
+        "ingredients_text": ingredients_text,
+        "labels": product.get("labels") or "",
+        "source": "OpenFoodFacts"
+    }
+
+def map_fdc_food(food_item: Dict[str, Any], barcode: Optional[str] = None) -> Dict[str, Any]:
+    """Map a FoodData Central food (search API shape) to our product info dict"""
+    ingredients_text = food_item.get("ingredients") or ""
+    return {
+        "name": food_item.get("description") or "Unknown Product",
+        "brand": food_item.get("brandOwner", food_item.get("marketCountry", None)),
+        "ingredients": split_ingredients(ingredients_text),
+        "ingredients_text": ingredients_text,
+        "fdc_id": food_item.get("fdcId"),
+        "data_type": food_item.get("dataType"),
+        "upc_match": bool(barcode) and barcode_key(food_item.get("gtinUpc") or "") == barcode_key(barcode),
+        "publication_date": food_item.get("publicationDate")
+    }
+
+def barcode_key(barcode: str) -> str:
+    """Normalize a barcode for store lookups (digits only, no leading zeros)
+
+    UPC-A scans (12 digits) and their EAN-13/GTIN-14 forms differ only by
+    leading zeros, so they share a key.
+    """
+    digits = re.sub(r'\D', '', barcode or '')
+    return digits.lstrip('0') or digits
+
+class LocalProductStore:
+    """SQLite-backed barcode store"""
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = str(path)
+        if read_only:
+            self.conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True, check_same_thread=False)
+        else:
+            Path(self.path).parent.mkdir(parents=True, exist_ok=True)
+            self.conn = sqlite3.connect(self.path)
+            self.conn.execute("PRAGMA journal_mode=WAL")
+            self.conn.execute("PRAGMA synchronous=NORMAL")
+            self.conn.executescript(SCHEMA)
+        # Stores written by older importers may lack some tables
+        self.tables = {row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def count(self, table: str) -> int:
+        return self.conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+
+    def get_openfoodfacts(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Return the mapped OpenFoodFacts record for a barcode, if present"""
+        key = barcode_key(barcode)
+        if not key or "openfoodfacts_products" not in self.tables:
+            return None
+        row = self.conn.execute(
+            "SELECT record FROM openfoodfacts_products WHERE barcode = ?", (key,)
+        ).fetchone()
+        return fastjson.loads(row[0]) if row else None
+
+    def get_fdc_branded(self, barcode: str) -> Optional[Dict[str, Any]]:
+        """Return the FDC Branded Foods record whose GTIN/UPC matches a barcode"""
+        key = barcode_key(barcode)
+        if not key or "fdc_branded_foods" not in self.tables:
+            return None
+        row = self.conn.execute(
+            "SELECT record FROM fdc_branded_foods WHERE gtin = ?", (key,)
+        ).fetchone()
+        return fastjson.loads(row[0]) if row else None
+
+    def get_progress(self, source: str) -> Optional[Dict[str, Any]]:
+        row = self.conn.execute(
+            "SELECT path, rows_read, rows_imported, completed FROM import_progress WHERE source = ?",
+            (source,)
+        ).fetchone()
+        if not row:
+            return None
+        return {"path": row[0], "rows_read": row[1], "rows_imported": row[2], "completed": bool(row[3])}
+
+    def save_progress(self, source: str, path: str, rows_read: int, rows_imported: int, completed: bool = False) -> None:
+        self.conn.execute(
+            "INSERT OR REPLACE INTO import_progress "
+            "(source, path, rows_read, rows_imported, completed, updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (source, path, rows_read, rows_imported, int(completed), time.time())
+        )
+
+def open_text(path: str) -> io.TextIOBase:
+    """Open a plain or gzip-compressed text file for streaming"""
+    if str(path).endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8", errors="replace", newline="")
+    return open(path, "r", encoding="utf-8", errors="replace", newline="")
+
+def iter_openfoodfacts_dump(path: str, fmt: str, skip: int = 0) -> Iterator[Optional[Dict[str, Any]]]:
+    """Stream products from an OpenFoodFacts JSONL or CSV (tab-separated) dump
+
+    Yields one item per input row (None for rows that can't be parsed) so row
+    counts stay aligned with resume positions. The first `skip` rows are
+    passed over without being parsed.
+    """
+    with open_text(path) as handle:
+        if fmt == "jsonl":
+            for index, line in enumerate(handle):
+                if index < skip:
+                    continue
+                try:
+                    yield fastjson.loads(line)
+                except ValueError:
+                    yield None
+        else:
+            csv.field_size_limit(sys.maxsize)
+            reader = csv.DictReader(handle, delimiter="\t", quoting=csv.QUOTE_NONE)
+            for index, row in enumerate(reader):
+                if index < skip:
+                    continue
+                yield row
+
+def detect_dump_format(path: str) -> str:
+    name = str(path).lower().removesuffix(".gz")
+    return "jsonl" if name.endswith((".jsonl", ".json")) else "csv"
+
+def resume_position(store: LocalProductStore, source: str, path: str, restart: bool) -> Optional[tuple]:
+    """Return (rows_read, rows_imported) to resume from, or None if already complete"""
+    progress = store.get_progress(source)
+    if not progress or restart or progress["path"] != str(path):
+        return 0, 0
+    if progress["completed"]:
+        logger.info(f"{source} already imported from {path}; use --restart to re-import")
+        return None
+    logger.info(f"Resuming {source} import at row {progress['rows_read']}")
+    return progress["rows_read"], progress["rows_imported"]
+
+def run_import_stage(store: LocalProductStore, source: str, path: str, rows: Iterator[Any],
+                     position: tuple, to_params, sql: str, batch_size: int) -> Dict[str, Any]:
+    """Stream rows into the store in batches, saving resume progress with each batch"""
+    skip, rows_imported = position
+    rows_read = skip
+    batch = []
+    started = time.monotonic()
+    last_log = started
+
+    def flush(completed: bool = False) -> None:
+        with store.conn:
+            store.conn.executemany(sql, batch)
+            store.save_progress(source, str(path), rows_read, rows_imported, completed)
+        batch.clear()
+
+    for row in rows:
+        rows_read += 1
+        params = to_params(row) if row else None
+        if params:
+            batch.append(params)
+            rows_imported += 1
+
+        if rows_read % batch_size == 0:
+            flush()
+            now = time.monotonic()
+            if now - last_log >= PROGRESS_LOG_SECONDS:
+                rate = (rows_read - skip) / (now - started)
+                logger.info(f"{source}: {rows_read} rows read, {rows_imported} imported, {rate:,.0f} rows/sec")
+                last_log = now
+
+    flush(completed=True)
+    elapsed = time.monotonic() - started
+    rate = (rows_read - skip) / elapsed if elapsed else 0.0
+    logger.info(f"{source} finished: {rows_read} rows read, {rows_imported} imported in {elapsed:.1f}s ({rate:,.0f} rows/sec)")
+    return {"path": str(path), "rows_read": rows_read, "rows_imported": rows_imported,
+            "completed": True, "rows_per_second": rate}
+
+def openfoodfacts_params(product: Dict[str, Any]):
+    key = barcode_key(product.get("code", ""))
+    if not key:
+        return None
+    return (key, json.dumps(map_openfoodfacts_product(product), separators=(",", ":")))
+
+def import_openfoodfacts_dump(store: LocalProductStore, path: str, fmt: Optional[str] = None,
+                              batch_size: int = IMPORT_BATCH_SIZE, restart: bool = False) -> Optional[Dict[str, Any]]:
+    """Stream an OpenFoodFacts dump into the store, resuming a previous run if possible"""
+    source = "openfoodfacts"
+    position = resume_position(store, source, path, restart)
+    if position is None:
+        return None
+    rows = iter_openfoodfacts_dump(path, fmt or detect_dump_format(path), skip=position[0])
+    return run_import_stage(
+        store, source, path, rows, position, openfoodfacts_params,
+        "INSERT OR REPLACE INTO openfoodfacts_products (barcode, record) VALUES (?, ?)",
+        batch_size
+    )
+
+def open_fdc_csv(path: str, filename: str) -> io.TextIOBase:
+    """Open a CSV from an FDC download, given either the .zip or its extracted directory"""
+    if zipfile.is_zipfile(path):
+        archive = zipfile.ZipFile(path)
+        for member in archive.namelist():
+            if Path(member).name == filename:
+                return io.TextIOWrapper(archive.open(member), encoding="utf-8", errors="replace", newline="")
+        raise FileNotFoundError(f"{filename} not found in {path}")
+
+    matches = sorted(Path(path).rglob(filename))
+    if not matches:
+        raise FileNotFoundError(f"{filename} not found under {path}")
+    return open(matches[0], "r", encoding="utf-8", errors="replace", newline="")
+
+def iter_fdc_csv(path: str, filename: str, skip: int = 0) -> Iterator[Dict[str, str]]:
+    with open_fdc_csv(path, filename) as handle:
+        for index, row in enumerate(csv.DictReader(handle)):
+            if index < skip:
+                continue
+            yield row
+
+def fdc_description_params(row: Dict[str, str]):
+    if row.get("data_type") != "branded_food":
+        return None
+    return (int(row["fdc_id"]), row.get("description"), row.get("publication_date"))
+
+def fdc_branded_params(store: LocalProductStore, row: Dict[str, str]):
+    key = barcode_key(row.get("gtin_upc", ""))
+    if not key:
+        return None
+
+    fdc_id = int(row["fdc_id"])
+    description = store.conn.execute(
+        "SELECT description, publication_date FROM fdc_food_descriptions WHERE fdc_id = ?", (fdc_id,)
+    ).fetchone()
+
+    # Shape the row like a search API result so the live mapping applies
+    food_item = {
+        "fdcId": fdc_id,
+        "description": description[0] if description else None,
+        "publicationDate": description[1] if description else None,
+        "dataType": "Branded",
+        "gtinUpc": row.get("gtin_upc"),
+        "ingredients": row.get("ingredients") or "",
+    }
+    if row.get("brand_owner"):
+        food_item["brandOwner"] = row["brand_owner"]
+    elif row.get("market_country"):
+        food_item["marketCountry"] = row["market_country"]
+
+    record = map_fdc_food(food_item, barcode=row.get("gtin_upc"))
+    record["source"] = "USDA FoodData Central"
+    return (key, json.dumps(record, separators=(",", ":")))
+
+def import_fdc_branded_foods(store: LocalProductStore, path: str,
+                             batch_size: int = IMPORT_BATCH_SIZE, restart: bool = False) -> Dict[str, Any]:
+    """Build the GTIN/UPC index from an FDC Branded Foods CSV download
+
+    Descriptions live in food.csv and brand/GTIN/ingredients in
+    branded_food.csv, so food.csv is streamed into a staging table first and
+    joined by fdc_id while branded_food.csv is streamed. Each stage resumes
+    independently.
+    """
+    stages = [
+        ("fdc_food", "food.csv",
+         "INSERT OR REPLACE INTO fdc_food_descriptions (fdc_id, description, publication_date) VALUES (?, ?, ?)",
+         fdc_description_params),
+        ("fdc_branded_food", "branded_food.csv",
+         "INSERT OR REPLACE INTO fdc_branded_foods (gtin, record) VALUES (?, ?)",
+         lambda row: fdc_branded_params(store, row)),
+    ]
+
+    for source, filename, sql, to_params in stages:
+        position = resume_position(store, source, path, restart)
+        if position is None:
+            continue
+        rows = iter_fdc_csv(path, filename, skip=position[0])
+        run_import_stage(store, source, path, rows, position, to_params, sql, batch_size)
+
+    # Descriptions are only needed while joining
+    with store.conn:
+        store.conn.execute("DELETE FROM fdc_food_descriptions")
+
+    return {"path": str(path), "products": store.count("fdc_branded_foods"), "completed": True}
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+"""Management commands for the Ingrid backend.
+
+Usage:
+    python manage.py import-openfoodfacts openfoodfacts-products.jsonl.gz
+    python manage.py import-fdc-branded FoodData_Central_branded_food_csv_2024-10-31.zip
+    python manage.py build-catalog --limit 1000000
+    python manage.py import-organic OrganicIntegrityDatabase_export.csv
+"""
+import argparse
+import logging
+import os
+import sys
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+from catalog import build_catalog_from_products
+from local_store import LocalProductStore, import_fdc_branded_foods, import_openfoodfacts_dump
+from organic_index import import_organic_operations
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+DEFAULT_LOCAL_STORE_PATH = os.environ.get('LOCAL_STORE_PATH', str(ROOT_DIR / 'data' / 'products.db'))
+DEFAULT_CATALOG_PATH = os.environ.get('CATALOG_PATH', str(ROOT_DIR / 'data' / 'catalog.bin'))
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+
+def import_openfoodfacts(args: argparse.Namespace) -> int:
+    store = LocalProductStore(args.store)
+    try:
+        import_openfoodfacts_dump(
+            store,
+            args.path,
+            fmt=args.format,
+            batch_size=args.batch_size,
+            restart=args.restart
+        )
+    finally:
+        store.close()
+    return 0
+
+def import_fdc_branded(args: argparse.Namespace) -> int:
+    store = LocalProductStore(args.store)
+    try:
+        import_fdc_branded_foods(
+            store,
+            args.path,
+            batch_size=args.batch_size,
+            restart=args.restart
+        )
+    finally:
+        store.close()
+    return 0
+
+def import_organic(args: argparse.Namespace) -> int:
+    store = LocalProductStore(args.store)
+    try:
+        import_organic_operations(store, args.path)
+    finally:
+        store.close()
+    return 0
+
+def build_catalog(args: argparse.Namespace) -> int:
+    from pymongo import MongoClient
+
+    mongo_client = MongoClient(os.environ['MONGO_URL'])
+    try:
+        build_catalog_from_products(mongo_client[os.environ['DB_NAME']], args.output, limit=args.limit)
+    finally:
+        mongo_client.close()
+    return 0
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Ingrid backend management commands")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    off = subparsers.add_parser(
+        "import-openfoodfacts",
+        help="Stream an OpenFoodFacts JSONL/CSV dump (optionally .gz) into the local barcode store"
+    )
+    off.add_argument("path", help="Path to the dump file")
+    off.add_argument("--format", choices=["jsonl", "csv"], help="Dump format (default: from file name)")
+    off.add_argument("--store", default=DEFAULT_LOCAL_STORE_PATH, help="Local store path")
+    off.add_argument("--batch-size", type=int, default=10000, help="Rows per transaction")
+    off.add_argument("--restart", action="store_true", help="Ignore saved progress and import from the start")
+    off.set_defaults(func=import_openfoodfacts)
+
+    fdc = subparsers.add_parser(
+        "import-fdc-branded",
+        help="Build the GTIN/UPC index from an FDC Branded Foods CSV download (.zip or extracted directory)"
+    )
+    fdc.add_argument("path", help="Path to the download .zip or its extracted directory")
+    fdc.add_argument("--store", default=DEFAULT_LOCAL_STORE_PATH, help="Local store path")
+    fdc.add_argument("--batch-size", type=int, default=10000, help="Rows per transaction")
+    fdc.add_argument("--restart", action="store_true", help="Ignore saved progress and import from the start")
+    fdc.set_defaults(func=import_fdc_branded)
+
+    organic = subparsers.add_parser(
+        "import-organic",
+        help="Import certified operations from a USDA Organic Integrity Database CSV export"
+    )
+    organic.add_argument("path", help="Path to the CSV export")
+    organic.add_argument("--store", default=DEFAULT_LOCAL_STORE_PATH, help="Local store path")
+    organic.set_defaults(func=import_organic)
+
+    catalog = subparsers.add_parser(
+        "build-catalog",
+        help="Build the memory-mapped product catalog from the product cache"
+    )
+    catalog.add_argument("--output", default=DEFAULT_CATALOG_PATH, help="Catalog path")
+    catalog.add_argument("--limit", type=int, help="Only include the N most-scanned barcodes")
+    catalog.set_defaults(func=build_catalog)
+
+    return parser
+
+def main(argv=None) -> int:
+    args = build_parser().parse_args(argv)
+    return args.func(args)
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,483 @@
+"""OCR worker process pool.
+
+Recognition runs in dedicated worker processes, each holding its own OCR
+engine (see ocr_engines.py), so label photos never compete with the event loop (or its GIL) for
+CPU. The pool bounds the number of jobs in flight; submissions beyond that
+are rejected with OCRQueueFull so the API can shed load instead of queueing
+without limit.
+
+This module is imported by the worker processes, so it must not import
+server.py.
+"""
+import asyncio
+import logging
+import math
+import multiprocessing
+import os
+import re
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from ocr_engines import OCR_ENGINES, EasyOCREngine, OCREngine, OCRResult, to_result
+from preprocess import load_for_ocr
+
+logger = logging.getLogger(__name__)
+
+# Start of "ingredients", "ingredientes", "ingrédients", allowing the usual
+# OCR slips (l/1 for i, missing accents)
+INGREDIENTS_ANCHOR = re.compile(r"[il1|]ngr[eéè]d[il1|]?[eé]nt", re.IGNORECASE)
+# Probe crops cover the first N line heights of each text box, enough for
+# "Ingredients:" at typical letter widths
+PROBE_WIDTH_LINES = 8
+# Lines further below the ingredient block than this many line heights end it
+CONTINUATION_GAP_LINES = 1.0
+# A horizontal gap wider than this many line heights on the anchor's line
+# starts another column (e.g. a nutrition panel beside the ingredients)
+COLUMN_GAP_LINES = 2.0
+
+# Rendered into the synthetic label used to warm up each worker's model
+WARMUP_TEXT = "INGREDIENTS: WATER, ORGANIC CANE SUGAR, SEA SALT"
+
+# The worker process's engine, created by init_worker
+_engine: Optional[OCREngine] = None
+
+class OCRQueueFull(Exception):
+    """Raised when the OCR pool already has its maximum number of jobs in flight"""
+
+def synthetic_label() -> np.ndarray:
+    """A small grayscale image of an ingredient line, for warmup inference"""
+    image = Image.new("L", (420, 40), color=255)
+    ImageDraw.Draw(image).text((10, 14), WARMUP_TEXT, fill=0)
+    # The default bitmap font is tiny; scale up to a typical label text height
+    return np.asarray(image.resize((1260, 120)))
+
+def init_worker(languages: List[str], warmup: bool = True, engine: str = "easyocr") -> None:
+    """Load the OCR engine once per worker process and optionally warm it up"""
+    global _engine
+    started = time.time()
+    _engine = OCR_ENGINES[engine](languages)
+    loaded = time.time()
+    if warmup:
+        # The first inference pays one-off allocation and kernel selection costs
+        try:
+            _engine.readtext(synthetic_label())
+        except Exception as e:
+            logger.warning(f"OCR warmup failed in worker {os.getpid()}: {e}")
+    logger.info(f"OCR worker {os.getpid()} loaded {engine} in {loaded - started:.1f}s, "
+                f"warmed up in {time.time() - loaded:.1f}s")
+
+def worker_pid() -> int:
+    """Trivial job used to start workers and wait for their initializers"""
+    return os.getpid()
+
+def readtext(image: np.ndarray) -> OCRResult:
+    """Detect and recognize all text in an image (runs in a worker process)"""
+    return _engine.readtext(image)
+
+def clip_box(box: List[int], width: int, height: int) -> List[int]:
+    # easyocr clips boxes to the image the same way when cropping
+    x_min, x_max, y_min, y_max = box
+    return [max(0, int(x_min)), min(width, int(x_max)), max(0, int(y_min)), min(height, int(y_max))]
+
+def ingredient_block(boxes: List[List[int]], anchor: int) -> List[int]:
+    """Indexes of the anchor box, the rest of its line and its continuation lines
+
+    The anchor's line runs right until a gap of COLUMN_GAP_LINES line
+    heights. Continuation lines start within CONTINUATION_GAP_LINES line
+    heights below the block and overlap it horizontally (give or take a line
+    height).
+    """
+    x_min, x_max, y_min, y_max = boxes[anchor]
+    line_height = max(1, y_max - y_min)
+    block = [anchor]
+    left, right, bottom = x_min, x_max, y_max
+
+    # Rest of the anchor's line, up to the next column
+    same_line = sorted(
+        (index for index, (bx_min, bx_max, by_min, by_max) in enumerate(boxes)
+         if index != anchor and bx_min >= x_min and min(y_max, by_max) - max(y_min, by_min) > line_height / 2),
+        key=lambda index: boxes[index][0]
+    )
+    for index in same_line:
+        bx_min, bx_max, _, by_max = boxes[index]
+        if bx_min - right > COLUMN_GAP_LINES * line_height:
+            break
+        block.append(index)
+        right = max(right, bx_max)
+        bottom = max(bottom, by_max)
+
+    below = sorted(
+        (index for index, box in enumerate(boxes) if index not in block and box[2] >= y_min + line_height / 2),
+        key=lambda index: boxes[index][2]
+    )
+    for index in below:
+        bx_min, bx_max, by_min, by_max = boxes[index]
+        if by_min - bottom > CONTINUATION_GAP_LINES * line_height:
+            break
+        if bx_max >= left - line_height and bx_min <= right + line_height:
+            block.append(index)
+            bottom = max(bottom, by_max)
+            right = max(right, bx_max)
+    return block
+
+def readtext_ingredients(image: np.ndarray) -> OCRResult:
+    """Two-stage OCR that recognizes only the ingredient block (runs in a worker process)
+
+    Text boxes are detected first and only the start of each box is
+    recognized, looking for the ingredients anchor. The anchor's block is then
+    recognized in full. Short boxes that the probes covered completely (seals
+    such as "USDA ORGANIC") are kept too, ahead of the block so ingredient
+    extraction still starts at the anchor. Without an anchor every detected
+    box is recognized, as readtext would. Engines without separate detection
+    and recognition steps (Tesseract) recognize everything.
+    """
+    if not isinstance(_engine, EasyOCREngine):
+        return _engine.readtext(image)
+    reader = _engine.reader
+    height, width = image.shape[:2]
+    horizontal_list, free_list = reader.detect(image)
+    boxes = [clip_box(box, width, height) for box in horizontal_list[0]]
+    free = free_list[0]
+    if not boxes:
+        return to_result(reader.recognize(image, horizontal_list=[], free_list=free)) if free else []
+
+    probes = [
+        [x_min, min(x_max, x_min + PROBE_WIDTH_LINES * (y_max - y_min)), y_min, y_max]
+        for x_min, x_max, y_min, y_max in boxes
+    ]
+    # Results come back sorted by position, so match them up by top-left corner
+    probe_texts: Dict[Tuple[int, int], List[Tuple[Any, str, float]]] = {}
+    for result in reader.recognize(image, horizontal_list=probes, free_list=[]):
+        (x, y), text = result[0][0], result[1]
+        probe_texts.setdefault((int(x), int(y)), []).append(result)
+
+    def probe_result(index: int):
+        matches = probe_texts.get((boxes[index][0], boxes[index][2]))
+        return matches[0] if matches else None
+
+    # The topmost box whose start reads as the anchor
+    anchor = next(
+        (index for index in sorted(range(len(boxes)), key=lambda index: (boxes[index][2], boxes[index][0]))
+         if (result := probe_result(index)) and INGREDIENTS_ANCHOR.search(result[1])),
+        None
+    )
+    if anchor is None:
+        return to_result(reader.recognize(image, horizontal_list=boxes, free_list=free))
+
+    block = ingredient_block(boxes, anchor)
+    complete = [
+        probe_result(index) for index in range(len(boxes))
+        if index not in block and probes[index][1] == boxes[index][1] and probe_result(index)
+    ]
+    block_results = sorted(
+        reader.recognize(image, horizontal_list=[boxes[index] for index in block], free_list=[]),
+        key=lambda result: (result[0][0][1], result[0][0][0])
+    )
+    return to_result(complete) + to_result(block_results)
+
+OCR_MODES = {
+    "full": readtext,
+    "ingredients": readtext_ingredients,
+}
+
+def recognize(data: bytes, options: Optional[Dict[str, Any]] = None, mode: str = "full") -> OCRResult:
+    """Decode, preprocess and OCR uploaded image bytes (runs in a worker process)"""
+    return OCR_MODES[mode](load_for_ocr(data, options))
+
+def recognize_batch(batch: List[bytes], options: Optional[Dict[str, Any]] = None,
+                    mode: str = "full") -> List[OCRResult]:
+    """OCR several uploads in one pass (runs in a worker process)
+
+    In full mode the engine batches what it can (easyocr batches detection).
+    The two-stage mode picks boxes per image, so its images run one at a time.
+    """
+    images = [load_for_ocr(data, options) for data in batch]
+    if mode != "full":
+        return [OCR_MODES[mode](image) for image in images]
+    return _engine.readtext_batch(images)
+
+def timed_call(func: Callable, args: Tuple) -> Tuple[Any, float, float]:
+    """Run a job and report when it started and finished (wall clock, comparable across processes)"""
+    started = time.time()
+    result = func(*args)
+    return result, started, time.time()
+
+class OCRPool:
+    """Process pool for OCR jobs with a bounded queue and service metrics"""
+
+    def __init__(self, workers: int, queue_size: int, languages: List[str], warmup: bool = True,
+                 engine: str = "easyocr"):
+        self.workers = max(1, workers)
+        self.engine = engine
+        self.queue_size = max(0, queue_size)
+        # "loading" until start() has a warm worker, then "ready" or "failed"
+        self.state = "loading"
+        self.error: Optional[str] = None
+        self.load_seconds: Optional[float] = None
+        # Spawned rather than forked: PyTorch is not fork-safe once initialized
+        self.executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=init_worker,
+            initargs=(languages, warmup, engine)
+        )
+        self.in_flight = 0
+        # Set whenever slots are released, waking acquire() callers
+        self._released = asyncio.Event()
+        self.waiting = 0
+        self.stats_counters = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "rejected": 0,
+            "queue_seconds_total": 0.0,
+            "queue_seconds_max": 0.0,
+            "service_seconds_total": 0.0,
+            "service_seconds_max": 0.0,
+        }
+
+    async def start(self) -> bool:
+        """Spawn the workers and wait until their models are loaded and warm
+
+        Jobs submitted meanwhile queue behind the load as usual.
+        """
+        started = time.monotonic()
+        try:
+            # One trivial job per worker spawns them all; each runs its
+            # initializer (model load and warmup) before taking a job
+            await asyncio.gather(*(
+                asyncio.wrap_future(self.executor.submit(worker_pid)) for _ in range(self.workers)
+            ))
+        except Exception as e:
+            self.state = "failed"
+            self.error = str(e) or type(e).__name__
+            logger.error(f"OCR workers failed to start: {self.error}")
+            return False
+        self.state = "ready"
+        self.load_seconds = time.monotonic() - started
+        logger.info(f"OCR pool ready in {self.load_seconds:.1f}s")
+        return True
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    @property
+    def capacity(self) -> int:
+        """Jobs that may be in flight: one running per worker plus the queue"""
+        return self.workers + self.queue_size
+
+    @property
+    def queue_depth(self) -> int:
+        return max(0, self.in_flight - self.workers)
+
+    def reserve(self, count: int = 1) -> None:
+        """Claim queue slots for images, or raise OCRQueueFull if there is no room"""
+        if self.in_flight + count > self.capacity:
+            self.stats_counters["rejected"] += count
+            raise OCRQueueFull(f"OCR queue is full ({self.in_flight} images in flight)")
+        self.in_flight += count
+
+    async def acquire(self, count: int = 1) -> None:
+        """Claim queue slots for images, waiting for running jobs to free them
+
+        Raises OCRQueueFull only if `count` exceeds the pool's capacity.
+        Callers that must not wait, like interactive scans, use reserve().
+        """
+        if count > self.capacity:
+            raise OCRQueueFull(f"{count} images exceed the OCR pool capacity of {self.capacity}")
+        self.waiting += 1
+        try:
+            while self.in_flight + count > self.capacity:
+                self._released.clear()
+                await self._released.wait()
+        finally:
+            self.waiting -= 1
+        self.in_flight += count
+
+    def release(self, count: int = 1) -> None:
+        """Free reserved slots; runs when a job ends, even if its request was cancelled"""
+        self.in_flight -= count
+        self._released.set()
+
+    def _notify(self, loop: asyncio.AbstractEventLoop, count: int) -> None:
+        # Called from the executor's management thread
+        try:
+            loop.call_soon_threadsafe(self.release, count)
+        except RuntimeError:
+            # Event loop already closed during shutdown
+            pass
+
+    async def run(self, func: Callable, *args: Any) -> Any:
+        """Run func(*args) in a worker process, or raise OCRQueueFull if the queue is full"""
+        self.reserve()
+        result, _, _ = await self.run_reserved(1, func, *args)
+        return result
+
+    async def run_reserved(self, count: int, func: Callable, *args: Any) -> Tuple[Any, float, float]:
+        """Run a job covering `count` images already reserved with reserve()
+
+        Returns the result with the job's queue and service times in seconds.
+        """
+        loop = asyncio.get_running_loop()
+        self.stats_counters["submitted"] += 1
+        submitted = time.time()
+        try:
+            future = self.executor.submit(timed_call, func, args)
+        except Exception:
+            self.release(count)
+            raise
+        future.add_done_callback(lambda done: self._notify(loop, count))
+
+        try:
+            result, started, finished = await asyncio.wrap_future(future)
+        except Exception:
+            self.stats_counters["failed"] += 1
+            raise
+
+        queued = max(0.0, started - submitted)
+        service = finished - started
+        stats = self.stats_counters
+        stats["completed"] += 1
+        stats["queue_seconds_total"] += queued
+        stats["queue_seconds_max"] = max(stats["queue_seconds_max"], queued)
+        stats["service_seconds_total"] += service
+        stats["service_seconds_max"] = max(stats["service_seconds_max"], service)
+        return result, queued, service
+
+    def average_service_seconds(self) -> Optional[float]:
+        completed = self.stats_counters["completed"]
+        return self.stats_counters["service_seconds_total"] / completed if completed else None
+
+    def retry_after(self, default: int) -> int:
+        """Seconds until a rejected client should retry: time to drain the current queue"""
+        service = self.average_service_seconds()
+        if service is None:
+            return default
+        return max(1, math.ceil(service * (self.queue_depth + 1) / self.workers))
+
+    def stats(self) -> Dict[str, Any]:
+        stats = self.stats_counters
+        completed = stats["completed"]
+        return {
+            "state": self.state,
+            "engine": self.engine,
+            "error": self.error,
+            "load_seconds": round(self.load_seconds, 1) if self.load_seconds is not None else None,
+            "workers": self.workers,
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "waiting": self.waiting,
+            **stats,
+            "avg_queue_seconds": round(stats["queue_seconds_total"] / completed, 3) if completed else None,
+            "avg_service_seconds": round(stats["service_seconds_total"] / completed, 3) if completed else None,
+        }
+
+    def shutdown(self) -> None:
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+class OCRBatcher:
+    """Groups concurrent OCR requests into batches for the pool
+
+    Images are collected until `max_batch_size` are waiting or the first has
+    waited `max_wait` seconds, then recognized in one worker job. Each image
+    holds its own pool slot while it waits, so the queue bound still applies.
+    """
+
+    def __init__(self, pool: OCRPool, options: Optional[Dict[str, Any]], mode: str,
+                 max_batch_size: int, max_wait: float):
+        self.pool = pool
+        self.options = options
+        self.mode = mode
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_wait = max(0.0, max_wait)
+        self._pending: List[Tuple[bytes, asyncio.Future]] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: set = set()
+        self.counters = {"batches": 0, "images": 0, "max_batch_size": 0, "service_seconds_total": 0.0}
+        # (size, service seconds, seconds per image) of recent batches
+        self.recent = deque(maxlen=50)
+
+    async def recognize(self, data: bytes, reserved: bool = False) -> OCRResult:
+        """OCR one upload as part of the next batch
+
+        With `reserved`, the caller already claimed the image's pool slot with
+        pool.reserve(); otherwise it is claimed here.
+        """
+        if not reserved:
+            self.pool.reserve()
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending.append((data, future))
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_wait, self._flush)
+        return await future
+
+    def _flush(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            self._pending = self._pending[self.max_batch_size:]
+            task = asyncio.create_task(self._run(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _run(self, batch: List[Tuple[bytes, asyncio.Future]]) -> None:
+        # Skip images whose requests went away while waiting
+        waiting = [(data, future) for data, future in batch if not future.done()]
+        if len(waiting) < len(batch):
+            self.pool.release(len(batch) - len(waiting))
+            batch = waiting
+        if not batch:
+            return
+        try:
+            results, _, service = await self.pool.run_reserved(
+                len(batch), recognize_batch, [data for data, _ in batch], self.options, self.mode
+            )
+        except BaseException as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            if not isinstance(e, Exception):
+                raise
+            return
+
+        size = len(batch)
+        self.counters["batches"] += 1
+        self.counters["images"] += size
+        self.counters["max_batch_size"] = max(self.counters["max_batch_size"], size)
+        self.counters["service_seconds_total"] += service
+        self.recent.append((size, round(service, 3), round(service / size, 3)))
+        logger.info(f"OCR batch of {size} images in {service:.2f}s ({service / size:.2f}s per image)")
+
+        for (_, future), result in zip(batch, results):
+            if not future.done():
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        counters = self.counters
+        return {
+            "max_batch_size": self.max_batch_size,
+            "max_wait_seconds": self.max_wait,
+            "pending": len(self._pending),
+            "batches": counters["batches"],
+            "images": counters["images"],
+            "largest_batch": counters["max_batch_size"],
+            "avg_batch_size": round(counters["images"] / counters["batches"], 2) if counters["batches"] else None,
+            "avg_seconds_per_image": round(counters["service_seconds_total"] / counters["images"], 3)
+            if counters["images"] else None,
+            "recent_batches": [
+                {"size": size, "service_seconds": service, "seconds_per_image": per_image}
+                for size, service, per_image in self.recent
+            ],
+        }
@@ -0,0 +1,137 @@
+"""OCR engines loaded by the OCR worker processes.
+
+An engine turns a preprocessed image array into OCRResult regions: corner
+points, text and confidence in [0, 1]. easyocr (PyTorch) is the most accurate
+on curved, low-contrast packaging; Tesseract runs on CPU with a fraction of
+the memory and startup time, which suits images built without PyTorch. The
+engine is chosen with OCR_ENGINE.
+
+Runs in the OCR worker processes, so it must not import server.py.
+"""
+from abc import ABC, abstractmethod
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+# (box corner points, text, confidence) per detected text region
+OCRResult = List[Tuple[List[List[float]], str, float]]
+
+# Python module each engine needs, so the API process can check for it
+# without importing it
+ENGINE_MODULES = {
+    "easyocr": "easyocr",
+    "tesseract": "pytesseract",
+}
+
+# easyocr language codes to Tesseract traineddata names
+TESSERACT_LANGUAGES = {
+    "en": "eng",
+    "es": "spa",
+    "fr": "fra",
+    "de": "deu",
+    "it": "ita",
+    "pt": "por",
+    "nl": "nld",
+}
+
+# Fully automatic page segmentation; labels mix blocks, seals and columns
+TESSERACT_CONFIG = "--oem 1 --psm 3"
+
+def to_result(results) -> OCRResult:
+    return [
+        ([[float(x), float(y)] for x, y in box], text, float(confidence))
+        for box, text, confidence in results
+    ]
+
+def pad_to_common_size(images: List[np.ndarray]) -> np.ndarray:
+    """Stack images into one array, padding each with white at the right and bottom
+
+    Padding rather than resizing keeps text at its original scale and box
+    coordinates valid for the unpadded image.
+    """
+    height = max(image.shape[0] for image in images)
+    width = max(image.shape[1] for image in images)
+    batch = np.full((len(images), height, width) + images[0].shape[2:], 255, dtype=images[0].dtype)
+    for index, image in enumerate(images):
+        batch[index, :image.shape[0], :image.shape[1]] = image
+    return batch
+
+class OCREngine(ABC):
+    """Text detection and recognition backend"""
+
+    name = ""
+
+    @abstractmethod
+    def readtext(self, image: np.ndarray) -> OCRResult:
+        """Detect and recognize all text in a preprocessed image"""
+
+    def readtext_batch(self, images: List[np.ndarray]) -> List[OCRResult]:
+        """OCR several images; engines without batched inference run them in turn"""
+        return [self.readtext(image) for image in images]
+
+class EasyOCREngine(OCREngine):
+    """easyocr Reader; also exposes detect/recognize for two-stage recognition"""
+
+    name = "easyocr"
+
+    def __init__(self, languages: List[str]):
+        import easyocr
+        self.reader = easyocr.Reader(languages, verbose=False)
+
+    def readtext(self, image: np.ndarray) -> OCRResult:
+        return to_result(self.reader.readtext(image))
+
+    def readtext_batch(self, images: List[np.ndarray]) -> List[OCRResult]:
+        """Detection runs batched through readtext_batched
+
+        The padded images are passed as a list: easyocr only treats lists and
+        4-D arrays as batches, and grayscale images stack to a 3-D array.
+        """
+        if len(images) == 1:
+            return [self.readtext(images[0])]
+        batched = self.reader.readtext_batched(list(pad_to_common_size(images)), batch_size=len(images))
+        return [to_result(results) for results in batched]
+
+class TesseractEngine(OCREngine):
+    """Tesseract through pytesseract, with words grouped into line regions
+
+    Lines match easyocr's regions closely enough for ingredient extraction
+    and the front-of-package name and brand heuristic, which uses region
+    heights.
+    """
+
+    name = "tesseract"
+
+    def __init__(self, languages: List[str]):
+        import pytesseract
+        self.pytesseract = pytesseract
+        # Fails here, at worker start, if the tesseract binary is missing
+        pytesseract.get_tesseract_version()
+        self.lang = "+".join(TESSERACT_LANGUAGES.get(language, language) for language in languages)
+
+    def readtext(self, image: np.ndarray) -> OCRResult:
+        data = self.pytesseract.image_to_data(
+            image, lang=self.lang, config=TESSERACT_CONFIG, output_type=self.pytesseract.Output.DICT
+        )
+        # Words keyed by (block, paragraph, line), in reading order
+        lines: Dict[Tuple[int, int, int], List[int]] = {}
+        for index, word in enumerate(data["text"]):
+            if word.strip() and float(data["conf"][index]) >= 0:
+                key = (data["block_num"][index], data["par_num"][index], data["line_num"][index])
+                lines.setdefault(key, []).append(index)
+
+        results = []
+        for words in lines.values():
+            left = min(data["left"][index] for index in words)
+            top = min(data["top"][index] for index in words)
+            right = max(data["left"][index] + data["width"][index] for index in words)
+            bottom = max(data["top"][index] + data["height"][index] for index in words)
+            text = " ".join(data["text"][index].strip() for index in words)
+            confidence = sum(float(data["conf"][index]) for index in words) / len(words) / 100
+            results.append(([[left, top], [right, top], [right, bottom], [left, bottom]], text, confidence))
+        return to_result(results)
+
+OCR_ENGINES = {
+    "easyocr": EasyOCREngine,
+    "tesseract": TesseractEngine,
+}
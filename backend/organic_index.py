@@ -0,0 +1,153 @@
+"""In-memory index of USDA Organic Integrity Database certified operations.
+
+Operation names (and their "other names"/DBAs) from the Organic Integrity
+Database export are normalized to lowercase tokens with legal suffixes
+removed. A term matches when its normalized form equals an indexed name, is a
+multi-token prefix of one, or is close to one by trigram Dice similarity.
+Prefix and fuzzy matching suit brand names; generic product names ("Peanut
+Butter", "Whole Milk") start many operation names, so callers match those
+exactly.
+"""
+import bisect
+import csv
+import logging
+import math
+import re
+import unicodedata
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+from local_store import LocalProductStore
+
+logger = logging.getLogger(__name__)
+
+FUZZY_THRESHOLD = 0.82
+MIN_PREFIX_LENGTH = 6
+
+LEGAL_SUFFIXES = {
+    "inc", "incorporated", "llc", "ltd", "limited", "co", "corp", "corporation",
+    "company", "lp", "llp", "plc", "gmbh", "sa", "sas", "bv", "the",
+}
+
+def normalize_operation_name(name: str) -> str:
+    """Lowercase, strip accents and punctuation, and drop legal suffixes"""
+    text = unicodedata.normalize("NFKD", name or "")
+    text = "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+    text = text.replace("&", " and ").replace("'", "")
+    tokens = [token for token in re.split(r"[^a-z0-9]+", text) if token and token not in LEGAL_SUFFIXES]
+    return " ".join(tokens)
+
+def trigrams(normalized: str) -> Set[str]:
+    padded = f"  {normalized} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+class OrganicIndex:
+    """Exact, prefix and trigram-fuzzy matching over certified operation names"""
+
+    def __init__(self, names: Iterable[str]):
+        self.names: List[str] = sorted({name for name in names if name})
+        self._exact = set(self.names)
+        self._grams: List[Set[str]] = [trigrams(name) for name in self.names]
+        postings: Dict[str, List[int]] = defaultdict(list)
+        for index, grams in enumerate(self._grams):
+            for gram in grams:
+                postings[gram].append(index)
+        self._postings = dict(postings)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def match(self, term: str, exact: bool = False) -> Optional[Tuple[str, float]]:
+        """Return (matched name, score) for the best certified operation, if any
+
+        With `exact`, only an indexed name equal to the normalized term matches.
+        """
+        query = normalize_operation_name(term)
+        if not query:
+            return None
+
+        if query in self._exact:
+            return query, 1.0
+        if exact:
+            return None
+
+        # Multi-token prefix, e.g. "annies homegrown" -> "annies homegrown organic"
+        if " " in query and len(query) >= MIN_PREFIX_LENGTH:
+            index = bisect.bisect_left(self.names, query + " ")
+            if index < len(self.names) and self.names[index].startswith(query + " "):
+                return self.names[index], 0.95
+
+        query_grams = trigrams(query)
+        size = len(query_grams)
+        # A name within the Dice threshold shares at least min_common trigrams
+        # with the query and has a trigram count in [min_size, max_size]
+        min_common = math.ceil(FUZZY_THRESHOLD * size / (2 - FUZZY_THRESHOLD))
+        min_size = min_common
+        max_size = (2 - FUZZY_THRESHOLD) * size / FUZZY_THRESHOLD
+
+        # Prefix filtering: any such name must contain one of the query's
+        # (size - min_common + 1) rarest trigrams, so only those are scanned
+        ranked = sorted(query_grams, key=lambda gram: len(self._postings.get(gram, ())))
+        candidates = set()
+        for gram in ranked[:size - min_common + 1]:
+            candidates.update(self._postings.get(gram, ()))
+
+        best = None
+        best_score = 0.0
+        for index in candidates:
+            grams = self._grams[index]
+            if not min_size <= len(grams) <= max_size:
+                continue
+            score = 2 * len(query_grams & grams) / (size + len(grams))
+            if score > best_score:
+                best, best_score = index, score
+
+        if best is not None and best_score >= FUZZY_THRESHOLD:
+            return self.names[best], best_score
+        return None
+
+def find_column(fieldnames: List[str], *keywords: str) -> Optional[str]:
+    """Find the first header containing all keywords (export headers vary by version)"""
+    for field in fieldnames:
+        lowered = field.lower()
+        if all(keyword in lowered for keyword in keywords):
+            return field
+    return None
+
+def iter_certified_names(path: str) -> Iterable[str]:
+    """Yield operation and other names for certified operations in an OID CSV export"""
+    with open(path, "r", encoding="utf-8-sig", errors="replace", newline="") as handle:
+        reader = csv.DictReader(handle)
+        fields = reader.fieldnames or []
+        name_column = find_column(fields, "operation", "name") or find_column(fields, "name")
+        other_column = find_column(fields, "other", "name") or find_column(fields, "dba")
+        status_column = find_column(fields, "operation", "status") or find_column(fields, "status")
+        if not name_column:
+            raise ValueError(f"No operation name column found in {path}: {fields}")
+
+        for row in reader:
+            status = (row.get(status_column) or "").strip().lower() if status_column else "certified"
+            if status and status != "certified":
+                continue
+            yield row.get(name_column) or ""
+            # Other names are a delimited list of DBAs/brands
+            for other in re.split(r"[;|\n]", row.get(other_column) or "") if other_column else []:
+                yield other
+
+def import_organic_operations(store: LocalProductStore, path: str) -> int:
+    """Replace the certified operations table with names from an OID CSV export"""
+    names = {normalize_operation_name(name) for name in iter_certified_names(path)}
+    names.discard("")
+    with store.conn:
+        store.conn.execute("DELETE FROM organic_operations")
+        store.conn.executemany("INSERT OR IGNORE INTO organic_operations (name) VALUES (?)",
+                               ((name,) for name in names))
+    logger.info(f"Imported {len(names)} certified operation names from {path}")
+    return len(names)
+
+def load_organic_index(store: LocalProductStore) -> Optional[OrganicIndex]:
+    """Build the in-memory index from the store, or None if nothing was imported"""
+    if "organic_operations" not in store.tables:
+        return None
+    names = [row[0] for row in store.conn.execute("SELECT name FROM organic_operations")]
+    return OrganicIndex(names) if names else None
@@ -0,0 +1,128 @@
+"""Image preprocessing for OCR.
+
+Phone photos are converted to grayscale, scaled down so the longest side is
+at most `max_dimension`, turned upright from their EXIF orientation,
+contrast-stretched and optionally deskewed before recognition. OCR time grows
+with pixel count, and label text stays legible well below sensor resolution.
+JPEGs are decoded in draft mode at the smallest DCT scale that still covers
+the target size, and grayscale conversion and resizing come first, so the
+full-resolution bitmap is never built and later steps touch few pixels.
+
+Runs in the OCR worker processes, so it must not import server.py.
+"""
+import io
+from typing import Any, Dict, Optional
+
+import numpy as np
+from PIL import Image, ImageOps
+
+DEFAULT_OPTIONS = {
+    "max_dimension": 1600,
+    "grayscale": True,
+    "contrast": True,
+    "deskew": False,
+}
+
+# Deskew search range and coarse/fine steps, in degrees
+DESKEW_MAX_ANGLE = 10.0
+DESKEW_COARSE_STEP = 1.0
+DESKEW_FINE_STEP = 0.25
+# Skew is estimated on a copy this size to keep the search cheap
+DESKEW_SAMPLE_DIMENSION = 500
+
+# EXIF orientation tag values and the transpose that makes the image upright
+ORIENTATION_TAG = 0x0112
+ORIENTATION_TRANSPOSE = {
+    2: Image.Transpose.FLIP_LEFT_RIGHT,
+    3: Image.Transpose.ROTATE_180,
+    4: Image.Transpose.FLIP_TOP_BOTTOM,
+    5: Image.Transpose.TRANSPOSE,
+    6: Image.Transpose.ROTATE_270,
+    7: Image.Transpose.TRANSVERSE,
+    8: Image.Transpose.ROTATE_90,
+}
+
+def decode_image(data: bytes) -> Image.Image:
+    """Open image bytes; pixels are decoded lazily by preprocess_image"""
+    return Image.open(io.BytesIO(data))
+
+def estimate_skew(image: Image.Image) -> float:
+    """Estimate text skew in degrees with a projection profile search
+
+    Text lines are horizontal when the rows of the binarized image alternate
+    most sharply between ink and background, i.e. when the variance of the
+    row sums peaks.
+    """
+    sample = image.convert("L")
+    sample.thumbnail((DESKEW_SAMPLE_DIMENSION, DESKEW_SAMPLE_DIMENSION))
+    pixels = np.asarray(sample)
+    threshold = pixels.mean() - pixels.std() / 2
+    ink = Image.fromarray(((pixels < threshold) * 255).astype(np.uint8))
+
+    def profile_score(angle: float) -> float:
+        rotated = np.asarray(ink.rotate(angle, resample=Image.Resampling.NEAREST))
+        return float(np.var(rotated.sum(axis=1, dtype=np.int64)))
+
+    # Coarse search over the whole range, then refine around the best angle
+    coarse = np.arange(-DESKEW_MAX_ANGLE, DESKEW_MAX_ANGLE + DESKEW_COARSE_STEP / 2, DESKEW_COARSE_STEP)
+    best = max(coarse, key=profile_score)
+    fine = np.arange(best - DESKEW_COARSE_STEP, best + DESKEW_COARSE_STEP + DESKEW_FINE_STEP / 2, DESKEW_FINE_STEP)
+    return float(max(fine, key=profile_score))
+
+def preprocess_image(image: Image.Image, options: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """Apply the configured preprocessing steps and return an array for OCR"""
+    options = {**DEFAULT_OPTIONS, **(options or {})}
+    # Read before conversion, which drops the EXIF block
+    orientation = image.getexif().get(ORIENTATION_TAG)
+
+    max_dimension = options["max_dimension"]
+    if max_dimension and max(image.size) > max_dimension:
+        # JPEGs decode straight to a power-of-two reduced size no smaller than
+        # the target (and to grayscale if wanted), so the full-resolution
+        # bitmap never exists
+        scale = max_dimension / max(image.size)
+        image.draft("L" if options["grayscale"] else "RGB",
+                    (round(image.size[0] * scale), round(image.size[1] * scale)))
+
+    if options["grayscale"]:
+        image = image.convert("L")
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+
+    if max_dimension and max(image.size) > max_dimension:
+        image.thumbnail((max_dimension, max_dimension), Image.Resampling.LANCZOS)
+
+    if orientation in ORIENTATION_TRANSPOSE:
+        image = image.transpose(ORIENTATION_TRANSPOSE[orientation])
+
+    if options["contrast"]:
+        image = ImageOps.autocontrast(image, cutoff=1)
+
+    if options["deskew"]:
+        angle = estimate_skew(image)
+        if angle:
+            fill = 255 if image.mode == "L" else (255, 255, 255)
+            image = image.rotate(angle, resample=Image.Resampling.BICUBIC, expand=True, fillcolor=fill)
+
+    return np.asarray(image)
+
+def perceptual_hash(data: bytes) -> str:
+    """64-bit difference hash (dHash) of an upright grayscale thumbnail, as hex
+
+    Re-encoded or resized copies of a photo usually hash identically, where
+    their bytes do not.
+    """
+    image = decode_image(data)
+    orientation = image.getexif().get(ORIENTATION_TAG)
+    # JPEG draft mode decodes at 1/8 scale, so this never decodes full size
+    image.draft("L", (64, 64))
+    image = image.convert("L")
+    if orientation in ORIENTATION_TRANSPOSE:
+        image = image.transpose(ORIENTATION_TRANSPOSE[orientation])
+    pixels = np.asarray(image.resize((9, 8), Image.Resampling.LANCZOS), dtype=np.int16)
+    bits = (pixels[:, 1:] > pixels[:, :-1]).flatten()
+    return f"{int(np.packbits(bits).view('>u8')[0]):016x}"
+
+def load_for_ocr(data: bytes, options: Optional[Dict[str, Any]] = None) -> np.ndarray:
+    """Decode image bytes and preprocess them for recognition"""
+    return preprocess_image(decode_image(data), options)
@@ -1,27 +1,38 @@
 from fastapi import FastAPI, APIRouter, HTTPException, UploadFile, File, Form
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, StreamingResponse
 from dotenv import load_dotenv
 from motor.motor_asyncio import AsyncIOMotorClient
 import os
+import asyncio
+import importlib.util
 import logging
 from pathlib import Path
 from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 import uuid
-from datetime import datetime
+import copy
+import time
+import functools
+import hashlib
+import heapq
+import itertools
+import contextvars
+from collections import OrderedDict, deque
+from datetime import datetime, timedelta
 import httpx
 import json
 import re
 import base64
 from PIL import Image
 import io
-import numpy as np
-try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
-    easyocr = None
-    EASYOCR_AVAILABLE = False
+import fastjson
+from catalog import PLACEHOLDER_SOURCE, ProductCatalog
+from local_store import LocalProductStore, map_fdc_food, map_openfoodfacts_product
+from organic_index import OrganicIndex, load_organic_index
+from ocr import OCR_MODES, OCRBatcher, OCRPool, OCRQueueFull
+from ocr_engines import ENGINE_MODULES, OCR_ENGINES
+from preprocess import perceptual_hash
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
@@ -38,26 +49,215 @@ mongo_url = os.environ['MONGO_URL']
 client = AsyncIOMotorClient(mongo_url)
 db = client[os.environ['DB_NAME']]
 
+# Product cache configuration (seconds)
+# Entries older than the refresh window are still served but re-fetched from
+# upstream in the background; entries past the expiry window are removed by
+# MongoDB's TTL monitor.
+PRODUCT_CACHE_REFRESH_SECONDS = int(os.environ.get('PRODUCT_CACHE_REFRESH_SECONDS', 24 * 60 * 60))
+PRODUCT_CACHE_EXPIRE_SECONDS = int(os.environ.get('PRODUCT_CACHE_EXPIRE_SECONDS', 30 * 24 * 60 * 60))
+
+# Background refresh of stale product cache entries. With no workers, stale
+# entries are re-fetched inline instead.
+PRODUCT_REFRESH_WORKERS = int(os.environ.get('PRODUCT_REFRESH_WORKERS', 2))
+PRODUCT_REFRESH_QUEUE_SIZE = int(os.environ.get('PRODUCT_REFRESH_QUEUE_SIZE', 500))
+
+# In-process upstream lookup cache configuration
+LOOKUP_CACHE_MAX_ENTRIES = int(os.environ.get('LOOKUP_CACHE_MAX_ENTRIES', 10000))
+LOOKUP_CACHE_TTL_SECONDS = float(os.environ.get('LOOKUP_CACHE_TTL_SECONDS', 60 * 60))
+LOOKUP_CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get('LOOKUP_CACHE_NEGATIVE_TTL_SECONDS', 5 * 60))
+
+# Shared upstream HTTP client configuration (limits apply per upstream host)
+UPSTREAM_CONNECT_TIMEOUT = float(os.environ.get('UPSTREAM_CONNECT_TIMEOUT', 3.0))
+UPSTREAM_READ_TIMEOUT = float(os.environ.get('UPSTREAM_READ_TIMEOUT', 10.0))
+UPSTREAM_MAX_CONNECTIONS = int(os.environ.get('UPSTREAM_MAX_CONNECTIONS', 20))
+UPSTREAM_MAX_KEEPALIVE_CONNECTIONS = int(os.environ.get('UPSTREAM_MAX_KEEPALIVE_CONNECTIONS', 10))
+UPSTREAM_KEEPALIVE_EXPIRY = float(os.environ.get('UPSTREAM_KEEPALIVE_EXPIRY', 30.0))
+UPSTREAM_HTTP2 = os.environ.get('UPSTREAM_HTTP2', 'false').lower() in ('1', 'true', 'yes')
+UPSTREAMS = ["openfoodfacts", "usda_fdc", "usda_organic"]
+
+# How long a barcode lookup keeps waiting for a UPC-matched FDC record after
+# OpenFoodFacts has already answered
+LOOKUP_FDC_GRACE_SECONDS = float(os.environ.get('LOOKUP_FDC_GRACE_SECONDS', 0.5))
+
+# Local barcode store built by `python manage.py import-openfoodfacts` and
+# `python manage.py import-fdc-branded`
+LOCAL_STORE_PATH = os.environ.get('LOCAL_STORE_PATH', str(ROOT_DIR / 'data' / 'products.db'))
+
+# When the local organic index is loaded, optionally still ask the remote
+# Organic Integrity API about terms the index doesn't match
+ORGANIC_INDEX_REMOTE_FALLBACK = os.environ.get('ORGANIC_INDEX_REMOTE_FALLBACK', 'false').lower() in ('1', 'true', 'yes')
+
+# Memory-mapped catalog of high-traffic products built by `python manage.py build-catalog`
+CATALOG_PATH = os.environ.get('CATALOG_PATH', str(ROOT_DIR / 'data' / 'catalog.bin'))
+
+# Time budget for the USDA organic certification stage of a scan
+CERTIFICATION_STAGE_TIMEOUT = float(os.environ.get('CERTIFICATION_STAGE_TIMEOUT', 5.0))
+
+# Overall barcode scan deadline; the product lookup stage may use this share
+# of it and the certification stage gets whatever is left
+SCAN_DEADLINE_SECONDS = float(os.environ.get('SCAN_DEADLINE_SECONDS', 8.0))
+LOOKUP_STAGE_SHARE = float(os.environ.get('LOOKUP_STAGE_SHARE', 0.6))
+
+# Upstream circuit breaker configuration
+CIRCUIT_WINDOW = int(os.environ.get('CIRCUIT_WINDOW', 20))
+CIRCUIT_MIN_CALLS = int(os.environ.get('CIRCUIT_MIN_CALLS', 5))
+CIRCUIT_FAILURE_RATIO = float(os.environ.get('CIRCUIT_FAILURE_RATIO', 0.5))
+CIRCUIT_SLOW_CALL_SECONDS = float(os.environ.get('CIRCUIT_SLOW_CALL_SECONDS', 3.0))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get('CIRCUIT_OPEN_SECONDS', 30.0))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get('CIRCUIT_HALF_OPEN_PROBES', 1))
+
+# Upstream response size: only the OpenFoodFacts fields the product mapping
+# reads are requested, and FDC searches return this many results
+OPENFOODFACTS_FIELDS = "product_name,brands,ingredients_text,image_url,labels"
+FDC_SEARCH_PAGE_SIZE = int(os.environ.get('FDC_SEARCH_PAGE_SIZE', 3))
+
+# Outbound rate limits per upstream (requests/hour, 0 disables). Limits apply
+# per process, so divide the API key quota by the number of workers.
+RATE_LIMITS_PER_HOUR = {
+    "openfoodfacts": float(os.environ.get('RATE_LIMIT_OPENFOODFACTS_PER_HOUR', 6000)),
+    "usda_fdc": float(os.environ.get('RATE_LIMIT_USDA_FDC_PER_HOUR', 1000)),
+    "usda_organic": float(os.environ.get('RATE_LIMIT_USDA_ORGANIC_PER_HOUR', 1000)),
+}
+RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 20))
+# How long a call may queue for a token before degrading to cached data
+RATE_LIMIT_INTERACTIVE_MAX_WAIT = float(os.environ.get('RATE_LIMIT_INTERACTIVE_MAX_WAIT', 1.0))
+RATE_LIMIT_BACKGROUND_MAX_WAIT = float(os.environ.get('RATE_LIMIT_BACKGROUND_MAX_WAIT', 60.0))
+
+# OCR worker processes (each loads its own model) and the number of jobs that
+# may wait for one before new uploads are rejected with 503
+OCR_WORKERS = int(os.environ.get('OCR_WORKERS', 1))
+OCR_QUEUE_SIZE = int(os.environ.get('OCR_QUEUE_SIZE', 4))
+OCR_LANGUAGES = [lang.strip() for lang in os.environ.get('OCR_LANGUAGES', 'en').split(',') if lang.strip()]
+OCR_RETRY_AFTER_SECONDS = int(os.environ.get('OCR_RETRY_AFTER_SECONDS', 10))
+# Run a warmup inference on a synthetic label as each worker loads
+OCR_WARMUP = os.environ.get('OCR_WARMUP', 'true').lower() in ('1', 'true', 'yes')
+
+# OCR engine run by the workers (see ocr_engines.py): "easyocr" (PyTorch) or
+# "tesseract" (CPU, no PyTorch). Engines are only imported by the workers
+OCR_ENGINE = os.environ.get('OCR_ENGINE', 'easyocr')
+if OCR_ENGINE not in OCR_ENGINES:
+    raise ValueError(f"OCR_ENGINE must be one of {sorted(OCR_ENGINES)}, got {OCR_ENGINE!r}")
+OCR_ENGINE_AVAILABLE = importlib.util.find_spec(ENGINE_MODULES[OCR_ENGINE]) is not None
+
+# Image preprocessing before OCR (see preprocess.py); a max dimension of 0
+# keeps full resolution
+OCR_PREPROCESS = {
+    "max_dimension": int(os.environ.get('OCR_MAX_DIMENSION', 1600)),
+    "grayscale": os.environ.get('OCR_GRAYSCALE', 'true').lower() in ('1', 'true', 'yes'),
+    "contrast": os.environ.get('OCR_CONTRAST', 'true').lower() in ('1', 'true', 'yes'),
+    "deskew": os.environ.get('OCR_DESKEW', 'false').lower() in ('1', 'true', 'yes'),
+}
+
+# "full" recognizes every text region; "ingredients" detects regions first and
+# recognizes only the ingredient block (plus short seals), falling back to
+# full recognition when no "ingredients" anchor is found
+OCR_MODE = os.environ.get('OCR_MODE', 'full')
+if OCR_MODE not in OCR_MODES:
+    raise ValueError(f"OCR_MODE must be one of {sorted(OCR_MODES)}, got {OCR_MODE!r}")
+
+# Micro-batching: concurrent uploads are collected for up to
+# OCR_BATCH_MAX_WAIT_MS (or until OCR_BATCH_MAX_SIZE are waiting) and
+# recognized in one worker job. A max size of 1 disables batching.
+OCR_BATCH_MAX_SIZE = int(os.environ.get('OCR_BATCH_MAX_SIZE', 4))
+OCR_BATCH_MAX_WAIT_MS = float(os.environ.get('OCR_BATCH_MAX_WAIT_MS', 10))
+
+# OCR result cache keyed by the SHA-256 of the uploaded bytes: kept in memory
+# and in a capped MongoDB collection (bounded in bytes) that survives restarts.
+# With OCR_CACHE_PERCEPTUAL, uploads whose perceptual hash is within
+# OCR_CACHE_PERCEPTUAL_DISTANCE bits of a cached one also reuse its result.
+OCR_CACHE_MAX_ENTRIES = int(os.environ.get('OCR_CACHE_MAX_ENTRIES', 5000))
+OCR_CACHE_TTL_SECONDS = int(os.environ.get('OCR_CACHE_TTL_SECONDS', 7 * 24 * 60 * 60))
+OCR_CACHE_MAX_BYTES = int(os.environ.get('OCR_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+OCR_CACHE_PERCEPTUAL = os.environ.get('OCR_CACHE_PERCEPTUAL', 'false').lower() in ('1', 'true', 'yes')
+OCR_CACHE_PERCEPTUAL_DISTANCE = int(os.environ.get('OCR_CACHE_PERCEPTUAL_DISTANCE', 4))
+
+# Background OCR jobs: how long job state is kept, how many may be accepted
+# (queued or running) per process, and how often event streams poll for jobs
+# in other workers
+OCR_JOB_TTL_SECONDS = int(os.environ.get('OCR_JOB_TTL_SECONDS', 60 * 60))
+OCR_JOB_MAX_ACTIVE = int(os.environ.get('OCR_JOB_MAX_ACTIVE', 100))
+OCR_JOB_EVENT_POLL_SECONDS = float(os.environ.get('OCR_JOB_EVENT_POLL_SECONDS', 1.0))
+
+# Readiness probe: report not ready until OCR is loaded (for OCR-only deployments)
+READINESS_REQUIRES_OCR = os.environ.get('READINESS_REQUIRES_OCR', 'false').lower() in ('1', 'true', 'yes')
+READINESS_TIMEOUT_SECONDS = float(os.environ.get('READINESS_TIMEOUT_SECONDS', 2))
+
+# Largest request body accepted on OCR upload endpoints; larger uploads are
+# rejected with 413 before they are parsed or spooled
+OCR_MAX_UPLOAD_BYTES = int(os.environ.get('OCR_MAX_UPLOAD_BYTES', 10 * 1024 * 1024))
+# Photos accepted per multi-image scan; each may be up to OCR_MAX_UPLOAD_BYTES.
+# Each holds an OCR pool slot, so this can't exceed OCR_WORKERS + OCR_QUEUE_SIZE
+OCR_MAX_IMAGES = int(os.environ.get('OCR_MAX_IMAGES', 4))
+
+class UploadSizeLimit:
+    """ASGI middleware rejecting request bodies over a per-path byte limit
+    
+    `limits` maps path prefixes to their limit; the longest matching prefix
+    applies. A declared Content-Length over the limit is rejected before any
+    of the body is read. Chunked bodies are counted as they stream in and
+    abort with 413 once they pass the limit.
+    """
+    
+    def __init__(self, app, limits: Dict[str, int]):
+        self.app = app
+        self.limits = sorted(limits.items(), key=lambda item: len(item[0]), reverse=True)
+    
+    def _limit_for(self, path: str) -> Optional[int]:
+        for prefix, max_bytes in self.limits:
+            if path.startswith(prefix):
+                return max_bytes
+        return None
+    
+    @staticmethod
+    def _too_large(max_bytes: int) -> HTTPException:
+        return HTTPException(status_code=413, detail=f"Upload exceeds {max_bytes} bytes")
+    
+    async def __call__(self, scope, receive, send):
+        max_bytes = self._limit_for(scope["path"]) if scope["type"] == "http" else None
+        if max_bytes is None:
+            await self.app(scope, receive, send)
+            return
+        
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > max_bytes:
+            error = self._too_large(max_bytes)
+            response = FastJSONResponse({"detail": error.detail}, status_code=error.status_code)
+            await response(scope, receive, send)
+            return
+        
+        received = 0
+        
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > max_bytes:
+                    # An HTTPException passes through FastAPI's body parsing
+                    # and is rendered by its exception handler
+                    raise self._too_large(max_bytes)
+            return message
+        
+        await self.app(scope, limited_receive, send)
+
+class FastJSONResponse(JSONResponse):
+    """JSON response rendered with orjson when available"""
+    
+    def render(self, content: Any) -> bytes:
+        return fastjson.dumps(content)
+
 # Create the main app
 app = FastAPI(title="Ingrid MVP API", description="Food scanning and ingredient analysis API")
 
 # Create API router
-api_router = APIRouter(prefix="/api")
+api_router = APIRouter(prefix="/api", default_response_class=FastJSONResponse)
 
-# Initialize OCR reader with error handling
-try:
-    if EASYOCR_AVAILABLE:
-        ocr_reader = easyocr.Reader(['en'])
-        OCR_AVAILABLE = True
-        logger.info("EasyOCR initialized successfully")
-    else:
-        ocr_reader = None
-        OCR_AVAILABLE = False
-        logger.warning("EasyOCR not available: Module not installed. OCR functionality will be disabled.")
-except Exception as e:
-    ocr_reader = None
-    OCR_AVAILABLE = False
-    logger.warning(f"EasyOCR not available: {e}. OCR functionality will be disabled.")
+# OCR worker pool, started on startup when the OCR engine is installed; models load
+# in the background so the app serves other traffic meanwhile
+ocr_pool: Optional[OCRPool] = None
+ocr_batcher: Optional[OCRBatcher] = None
+ocr_pool_loader: Optional[asyncio.Task] = None
+OCR_AVAILABLE = False
 
 # Pydantic Models
 class ProductInfo(BaseModel):
@@ -96,7 +296,575 @@ class AnalysisResult(BaseModel):
     product: ProductInfo
     is_bookmarked: bool = False
 
+# Fields of a stored product document returned by the API
+PRODUCT_FIELDS = tuple(ProductInfo.model_fields)
+PRODUCT_PROJECTION = {"_id": 0, **{field: 1 for field in PRODUCT_FIELDS}}
+
+# Product cache counters, exposed via /api/admin/cache/stats
+product_cache_stats = {
+    "hits": 0,
+    "misses": 0,
+    "stale": 0,
+    "stale_served": 0,
+    "writes": 0,
+    "errors": 0,
+    "hit_age_seconds_total": 0.0,
+    "hit_age_seconds_max": 0.0,
+}
+
+# Background refresh queue for stale product cache entries, started at startup
+product_refresh_queue: Optional[asyncio.Queue] = None
+product_refresh_pending = set()
+product_refresh_workers: List[asyncio.Task] = []
+product_refresh_stats = {"queued": 0, "dropped": 0, "refreshed": 0, "unchanged": 0, "fresh": 0, "failed": 0}
+
+class TTLCache:
+    """Bounded in-memory LRU cache with a shorter TTL for "not found" results"""
+    
+    def __init__(self, name: str, maxsize: int, ttl: float, negative_ttl: float):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries: "OrderedDict[Any, tuple]" = OrderedDict()
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+    
+    def get(self, key: Any) -> tuple:
+        """Return (found, value); expired entries count as misses"""
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return False, None
+        
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            self.expirations += 1
+            self.misses += 1
+            return False, None
+        
+        self._entries.move_to_end(key)
+        self.hits += 1
+        if not value:
+            self.negative_hits += 1
+        return True, value
+    
+    def set(self, key: Any, value: Any, ttl: Optional[float] = None) -> None:
+        """Store a value, using the negative TTL for empty results unless `ttl` is given"""
+        if ttl is None:
+            ttl = self.ttl if value else self.negative_ttl
+        if ttl <= 0 or self.maxsize <= 0:
+            return
+        
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+    
+    def clear(self) -> None:
+        self._entries.clear()
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "max_size": self.maxsize,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+def cached_lookup(cache: TTLCache, key_func):
+    """Decorate an async upstream lookup so results are served from `cache`"""
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            key = key_func(*args, **kwargs)
+            found, value = cache.get(key)
+            if not found:
+                value = await func(*args, **kwargs)
+                cache.set(key, value)
+            # Hand out copies so callers can't mutate the cached value
+            return copy.copy(value)
+        return wrapper
+    return decorator
+
+openfoodfacts_cache = TTLCache("openfoodfacts", LOOKUP_CACHE_MAX_ENTRIES, LOOKUP_CACHE_TTL_SECONDS, LOOKUP_CACHE_NEGATIVE_TTL_SECONDS)
+fooddata_central_cache = TTLCache("usda_fooddata_central", LOOKUP_CACHE_MAX_ENTRIES, LOOKUP_CACHE_TTL_SECONDS, LOOKUP_CACHE_NEGATIVE_TTL_SECONDS)
+organic_certification_cache = TTLCache("usda_organic_certification", LOOKUP_CACHE_MAX_ENTRIES, LOOKUP_CACHE_TTL_SECONDS, LOOKUP_CACHE_NEGATIVE_TTL_SECONDS)
+lookup_caches = [openfoodfacts_cache, fooddata_central_cache, organic_certification_cache]
+
+class SingleFlight:
+    """Coalesce concurrent calls for the same key onto one shared task"""
+    
+    def __init__(self, name: str):
+        self.name = name
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.leaders = 0
+        self.coalesced = 0
+    
+    async def do(self, key: str, coro_factory):
+        """Await the in-flight task for `key`, starting one if there is none"""
+        task = self._in_flight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.create_task(coro_factory())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        else:
+            self.coalesced += 1
+        
+        # Shield so one caller disconnecting doesn't cancel the shared work
+        return await asyncio.shield(task)
+    
+    def _forget(self, key: str, task: asyncio.Task) -> None:
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+    
+    def stats(self) -> Dict[str, Any]:
+        requests = self.leaders + self.coalesced
+        return {
+            "in_flight": len(self._in_flight),
+            "leaders": self.leaders,
+            "coalesced": self.coalesced,
+            "coalesced_ratio": round(self.coalesced / requests, 4) if requests else 0.0,
+        }
+
+# Shared read-only mapping of the product catalog, opened at startup if present
+product_catalog: Optional[ProductCatalog] = None
+catalog_stats = {"hits": 0, "misses": 0, "errors": 0}
+# When each catalog barcode last queued a refresh of its product cache entry
+catalog_refresh_queued: Dict[str, float] = {}
+
+# Read-only handle on the local barcode store, opened at startup if present
+local_product_store: Optional[LocalProductStore] = None
+local_store_stats = {"hits": 0, "misses": 0, "errors": 0}
+
+# Certified operations imported by `python manage.py import-organic`
+organic_index: Optional[OrganicIndex] = None
+organic_index_stats = {"matches": 0, "misses": 0}
+
+# Identical barcode scans share one lookup + certification chain
+barcode_lookups = SingleFlight("barcode_lookups")
+
+class OCRResultCache:
+    """OCR text, ingredients and line heights by image hash, in memory and in MongoDB
+    
+    Entries are only valid for the OCR settings they were produced with, so
+    the settings are part of every key.
+    """
+    
+    def __init__(self, collection_name: str, settings: Dict[str, Any]):
+        self.collection_name = collection_name
+        self.settings_id = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:12]
+        self.memory = TTLCache("ocr_results", OCR_CACHE_MAX_ENTRIES, OCR_CACHE_TTL_SECONDS, 0)
+        # Perceptual hash -> content key, for near-duplicate lookups
+        self.perceptual: "OrderedDict[int, str]" = OrderedDict()
+        self.counters = {"hits": 0, "perceptual_hits": 0, "db_hits": 0, "misses": 0, "writes": 0, "errors": 0}
+    
+    @property
+    def collection(self):
+        return db[self.collection_name]
+    
+    def _remember(self, key: str, phash: Optional[str], value: Dict[str, Any], ttl: Optional[float] = None) -> None:
+        self.memory.set(key, value, ttl)
+        if phash:
+            self.perceptual[int(phash, 16)] = key
+            self.perceptual.move_to_end(int(phash, 16))
+            while len(self.perceptual) > OCR_CACHE_MAX_ENTRIES:
+                self.perceptual.popitem(last=False)
+    
+    def _remember_doc(self, doc: Dict[str, Any], now: datetime) -> Dict[str, Any]:
+        """Cache a persisted entry in memory for what is left of its TTL"""
+        value = {"text": doc["text"], "ingredients": doc["ingredients"], "lines": doc.get("lines", [])}
+        remaining = OCR_CACHE_TTL_SECONDS - (now - doc["created_at"]).total_seconds()
+        self._remember(doc["key"], doc.get("phash"), value, remaining)
+        return value
+    
+    def _live_query(self, now: datetime, **query: Any) -> Dict[str, Any]:
+        """Match this cache's settings and entries younger than OCR_CACHE_TTL_SECONDS"""
+        return {
+            **query,
+            "settings": self.settings_id,
+            "created_at": {"$gt": now - timedelta(seconds=OCR_CACHE_TTL_SECONDS)}
+        }
+    
+    async def get(self, key: str) -> Optional[Dict[str, Any]]:
+        """Look up an exact content hash in memory, then in MongoDB"""
+        found, value = self.memory.get(key)
+        if found:
+            self.counters["hits"] += 1
+            return value
+        now = datetime.utcnow()
+        try:
+            doc = await self.collection.find_one(self._live_query(now, key=key))
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"OCR cache read failed: {e}")
+            doc = None
+        if doc is None:
+            return None
+        value = self._remember_doc(doc, now)
+        self.counters["hits"] += 1
+        self.counters["db_hits"] += 1
+        return value
+    
+    def get_similar(self, phash: str) -> Optional[Dict[str, Any]]:
+        """Find a cached result whose perceptual hash is within the distance threshold"""
+        target = int(phash, 16)
+        best_key, best_distance = None, OCR_CACHE_PERCEPTUAL_DISTANCE + 1
+        for candidate, key in self.perceptual.items():
+            distance = (candidate ^ target).bit_count()
+            if distance < best_distance:
+                best_key, best_distance = key, distance
+        if best_key is None:
+            return None
+        found, value = self.memory.get(best_key)
+        if not found:
+            return None
+        self.counters["hits"] += 1
+        self.counters["perceptual_hits"] += 1
+        return value
+    
+    async def set(self, key: str, phash: Optional[str], value: Dict[str, Any]) -> None:
+        self._remember(key, phash, value)
+        try:
+            await self.collection.insert_one({
+                "key": key,
+                "settings": self.settings_id,
+                "phash": phash,
+                **value,
+                "created_at": datetime.utcnow()
+            })
+            self.counters["writes"] += 1
+        except Exception as e:
+            self.counters["errors"] += 1
+            logger.warning(f"OCR cache write failed: {e}")
+    
+    async def load(self) -> int:
+        """Warm the memory cache from the most recent unexpired persisted entries"""
+        now = datetime.utcnow()
+        cursor = self.collection.find(self._live_query(now)).sort("$natural", -1).limit(OCR_CACHE_MAX_ENTRIES)
+        docs = await cursor.to_list(OCR_CACHE_MAX_ENTRIES)
+        # Oldest first, so the newest end up most recently used
+        for doc in reversed(docs):
+            self._remember_doc(doc, now)
+        return len(docs)
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "memory": self.memory.stats(),
+            "perceptual_entries": len(self.perceptual),
+            "perceptual_enabled": OCR_CACHE_PERCEPTUAL,
+        }
+
+# OCR results by uploaded image, and coalescing of identical in-flight uploads
+# (e.g. client retries)
+ocr_result_cache = OCRResultCache(
+    "ocr_cache",
+    {"preprocess": OCR_PREPROCESS, "mode": OCR_MODE, "languages": OCR_LANGUAGES, "engine": OCR_ENGINE,
+     "version": 2}
+)
+ocr_runs = SingleFlight("ocr_runs")
+
+# Background OCR job tasks in this process, and wakeup events for their streams
+ocr_job_tasks: Dict[str, asyncio.Task] = {}
+ocr_job_listeners: Dict[str, set] = {}
+OCR_JOB_PROJECTION = {"_id": 0, "session_id": 0, "expires_at": 0}
+
+class UpstreamUnavailable(Exception):
+    """An upstream call was skipped or failed (open circuit, transport error, 429/5xx).
+    
+    Distinct from a "not found" answer, so it is never negative-cached.
+    """
+
+class CircuitBreaker:
+    """Per-upstream circuit breaker that trips on error rate or slow calls.
+    
+    Closed: calls flow and outcomes are tracked over a sliding window.
+    Open: calls are rejected until CIRCUIT_OPEN_SECONDS have passed.
+    Half-open: a limited number of probe calls decide whether to close again.
+    """
+    
+    def __init__(self, name: str):
+        self.name = name
+        self.state = "closed"
+        self.opened_at = 0.0
+        self.probes_in_flight = 0
+        self._outcomes = deque(maxlen=CIRCUIT_WINDOW)
+        self.trips = 0
+        self.short_circuited = 0
+        self.failures = 0
+        self.slow_calls = 0
+        self.calls = 0
+    
+    def allow(self) -> bool:
+        """Return True if a call may proceed now"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < CIRCUIT_OPEN_SECONDS:
+                self.short_circuited += 1
+                return False
+            self.state = "half_open"
+            self.probes_in_flight = 0
+            logger.info(f"Circuit for {self.name} is half-open, probing")
+        
+        if self.state == "half_open":
+            if self.probes_in_flight >= CIRCUIT_HALF_OPEN_PROBES:
+                self.short_circuited += 1
+                return False
+            self.probes_in_flight += 1
+        
+        return True
+    
+    def record(self, success: bool, duration: float) -> None:
+        """Record the outcome of an allowed call"""
+        self.calls += 1
+        slow = duration >= CIRCUIT_SLOW_CALL_SECONDS
+        if slow:
+            self.slow_calls += 1
+        if not success:
+            self.failures += 1
+        failed = slow or not success
+        
+        if self.state == "half_open":
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+            if failed:
+                self._trip()
+            else:
+                self.state = "closed"
+                self._outcomes.clear()
+                logger.info(f"Circuit for {self.name} closed")
+            return
+        
+        self._outcomes.append(failed)
+        if len(self._outcomes) >= CIRCUIT_MIN_CALLS:
+            failure_ratio = sum(self._outcomes) / len(self._outcomes)
+            if failure_ratio >= CIRCUIT_FAILURE_RATIO:
+                self._trip()
+    
+    def release(self) -> None:
+        """Give back a half-open probe slot for a call that was cancelled"""
+        if self.state == "half_open":
+            self.probes_in_flight = max(0, self.probes_in_flight - 1)
+    
+    def _trip(self) -> None:
+        self.state = "open"
+        self.opened_at = time.monotonic()
+        self.trips += 1
+        self._outcomes.clear()
+        logger.warning(f"Circuit for {self.name} opened for {CIRCUIT_OPEN_SECONDS}s")
+    
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "state": self.state,
+            "calls": self.calls,
+            "failures": self.failures,
+            "slow_calls": self.slow_calls,
+            "trips": self.trips,
+            "short_circuited": self.short_circuited,
+        }
+
+# Outbound call priorities; lower values are served first
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 1
+PRIORITY_NAMES = {PRIORITY_INTERACTIVE: "interactive", PRIORITY_BACKGROUND: "background"}
+
+# Priority of upstream calls made from the current task (inherited by child tasks)
+upstream_priority = contextvars.ContextVar("upstream_priority", default=PRIORITY_INTERACTIVE)
+
+class RateLimiter:
+    """Token bucket for one upstream with a priority queue of waiting calls"""
+    
+    def __init__(self, name: str, per_hour: float, burst: int):
+        self.name = name
+        self.rate = per_hour / 3600.0
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self._waiters: list = []
+        self._sequence = itertools.count()
+        self._drainer: Optional[asyncio.Task] = None
+        self.stats_by_priority = {
+            name: {"granted": 0, "rejected": 0, "queue_seconds_total": 0.0, "queue_seconds_max": 0.0}
+            for name in PRIORITY_NAMES.values()
+        }
+    
+    def _refill(self) -> None:
+        now = time.monotonic()
+        if now > self.paused_until:
+            self.tokens = min(self.burst, self.tokens + (now - max(self.updated, self.paused_until)) * self.rate)
+        self.updated = now
+    
+    def pause(self, seconds: float) -> None:
+        """Stop granting tokens for a while, e.g. after a 429 with Retry-After"""
+        self.tokens = 0.0
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+    
+    async def acquire(self, priority: int) -> None:
+        """Wait for a token, or raise UpstreamUnavailable once the wait budget is spent"""
+        stats = self.stats_by_priority[PRIORITY_NAMES[priority]]
+        self._refill()
+        if not self._waiters and self.tokens >= 1:
+            self.tokens -= 1
+            stats["granted"] += 1
+            return
+        
+        max_wait = RATE_LIMIT_INTERACTIVE_MAX_WAIT if priority == PRIORITY_INTERACTIVE else RATE_LIMIT_BACKGROUND_MAX_WAIT
+        waiter = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._sequence), waiter))
+        if self._drainer is None or self._drainer.done():
+            self._drainer = asyncio.create_task(self._drain())
+        
+        started = time.monotonic()
+        try:
+            await asyncio.wait_for(waiter, timeout=max_wait)
+        except asyncio.TimeoutError:
+            stats["rejected"] += 1
+            raise UpstreamUnavailable(f"{self.name} rate limit budget exhausted")
+        
+        queued = time.monotonic() - started
+        stats["granted"] += 1
+        stats["queue_seconds_total"] += queued
+        stats["queue_seconds_max"] = max(stats["queue_seconds_max"], queued)
+    
+    async def _drain(self) -> None:
+        """Hand out tokens to waiters in priority order as the bucket refills"""
+        while self._waiters:
+            self._refill()
+            while self._waiters and self.tokens >= 1:
+                _, _, waiter = heapq.heappop(self._waiters)
+                if waiter.done():
+                    # Timed out or cancelled while queued
+                    continue
+                self.tokens -= 1
+                waiter.set_result(None)
+            if self._waiters:
+                now = time.monotonic()
+                delay = max(self.paused_until - now, 0.0) + (1 - self.tokens) / self.rate
+                await asyncio.sleep(max(delay, 0.01))
+    
+    def stats(self) -> Dict[str, Any]:
+        self._refill()
+        return {
+            "per_hour": round(self.rate * 3600),
+            "tokens": round(self.tokens, 2),
+            "queue_depth": sum(1 for _, _, waiter in self._waiters if not waiter.done()),
+            "paused_seconds": round(max(0.0, self.paused_until - time.monotonic()), 1),
+            "by_priority": self.stats_by_priority,
+        }
+
+class Deadline:
+    """Overall time budget for a request, split across its stages"""
+    
+    def __init__(self, seconds: float):
+        self.expires_at = time.monotonic() + seconds
+    
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+    
+    def budget(self, share: float = 1.0, cap: Optional[float] = None) -> float:
+        """Time a stage may use: a share of what is left, optionally capped"""
+        seconds = self.remaining() * share
+        return min(seconds, cap) if cap is not None else seconds
+
+# Application-lifetime HTTP clients, one connection pool per upstream host
+upstream_clients: Dict[str, httpx.AsyncClient] = {}
+
+def create_upstream_client() -> httpx.AsyncClient:
+    """Create a pooled keep-alive client using the configured limits and timeouts"""
+    http2 = UPSTREAM_HTTP2
+    if http2:
+        try:
+            import h2  # noqa: F401
+        except ImportError:
+            logger.warning("UPSTREAM_HTTP2 is enabled but the 'h2' package is not installed; using HTTP/1.1")
+            http2 = False
+    
+    return httpx.AsyncClient(
+        timeout=httpx.Timeout(UPSTREAM_READ_TIMEOUT, connect=UPSTREAM_CONNECT_TIMEOUT),
+        limits=httpx.Limits(
+            max_connections=UPSTREAM_MAX_CONNECTIONS,
+            max_keepalive_connections=UPSTREAM_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=UPSTREAM_KEEPALIVE_EXPIRY
+        ),
+        http2=http2,
+        headers={"User-Agent": "IngridMVP/1.0"}
+    )
+
+def get_upstream_client(upstream: str) -> httpx.AsyncClient:
+    """Return the shared client for an upstream, creating it if startup hasn't run"""
+    http_client = upstream_clients.get(upstream)
+    if http_client is None or http_client.is_closed:
+        http_client = create_upstream_client()
+        upstream_clients[upstream] = http_client
+    return http_client
+
+circuit_breakers = {upstream: CircuitBreaker(upstream) for upstream in UPSTREAMS}
+rate_limiters = {
+    upstream: RateLimiter(upstream, RATE_LIMITS_PER_HOUR[upstream], RATE_LIMIT_BURST)
+    for upstream in UPSTREAMS if RATE_LIMITS_PER_HOUR.get(upstream, 0) > 0
+}
+
+async def upstream_get(upstream: str, url: str, **kwargs) -> httpx.Response:
+    """GET from an upstream through its rate limiter, circuit breaker and shared client.
+    
+    Raises UpstreamUnavailable if the circuit is open, the rate limit budget is
+    exhausted or the call fails, so callers can fall back to cached or local data.
+    """
+    breaker = circuit_breakers[upstream]
+    if not breaker.allow():
+        raise UpstreamUnavailable(f"{upstream} circuit is open")
+    
+    limiter = rate_limiters.get(upstream)
+    if limiter is not None:
+        try:
+            await limiter.acquire(upstream_priority.get())
+        except BaseException:
+            breaker.release()
+            raise
+    
+    started = time.monotonic()
+    try:
+        response = await get_upstream_client(upstream).get(url, **kwargs)
+    except asyncio.CancelledError:
+        # Stage budgets cancel calls well before the client's read timeout, so
+        # a call cancelled after the slow-call threshold counts as slow; a
+        # hung upstream would otherwise never trip the breaker
+        duration = time.monotonic() - started
+        if duration >= CIRCUIT_SLOW_CALL_SECONDS:
+            breaker.record(False, duration)
+        else:
+            breaker.release()
+        raise
+    except Exception as e:
+        breaker.record(False, time.monotonic() - started)
+        raise UpstreamUnavailable(f"{upstream} request failed: {e!r}") from e
+    
+    if response.status_code == 429 and limiter is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        limiter.pause(float(retry_after) if retry_after.isdigit() else 60.0)
+    
+    failed = response.status_code == 429 or response.status_code >= 500
+    breaker.record(not failed, time.monotonic() - started)
+    if failed:
+        raise UpstreamUnavailable(f"{upstream} returned HTTP {response.status_code}")
+    return response
+
 # Helper Functions
+def normalize_barcode(barcode: str) -> str:
+    """Normalize a scanned barcode so equivalent scans share a cache key"""
+    return re.sub(r'\s+', '', barcode or '')
+
 def calculate_rating(ingredient_count: int) -> str:
     """Calculate traffic light rating based on ingredient count"""
     if ingredient_count <= 4:
@@ -143,6 +911,31 @@ def extract_ingredients_from_text(text: str) -> List[str]:
     
     return ingredients[:50]  # Limit to reasonable number
 
+# Front-of-package text that is a claim or quantity rather than a name or brand
+FRONT_LABEL_CLAIMS = re.compile(
+    r'organic|usda|non[\s-]?gmo|gluten|kosher|vegan|certified|natural|\bnew\b|net\s*wt|\d',
+    re.IGNORECASE
+)
+
+def name_and_brand_from_front(lines: List[List[Any]]) -> Tuple[Optional[str], Optional[str]]:
+    """Guess product name and brand from the largest text on a package front
+    
+    `lines` are OCR regions as [text, top, height]. Of the two tallest regions
+    that are not claims or quantities, the upper one (usually the logo) is
+    taken as the brand and the lower as the product name.
+    """
+    candidates = [
+        (text.strip(), top, height) for text, top, height in lines
+        if re.search(r'[a-zA-Z]{3}', text) and not FRONT_LABEL_CLAIMS.search(text)
+    ]
+    if not candidates:
+        return None, None
+    tallest = sorted(candidates, key=lambda line: line[2], reverse=True)[:2]
+    if len(tallest) == 1:
+        return tallest[0][0], None
+    brand, name = sorted(tallest, key=lambda line: line[1])
+    return name[0], brand[0]
+
 def detect_certifications(text: str) -> List[str]:
     """Detect organic and non-GMO certifications"""
     text = text.lower()
@@ -163,19 +956,25 @@ def detect_certifications(text: str) -> List[str]:
     
     return certifications
 
-async def enhanced_certification_detection(product_name: str, brand: str = None, text: str = "") -> List[str]:
-    """Enhanced certification detection using USDA API and text analysis"""
+async def enhanced_certification_detection(product_name: str, brand: str = None, text: str = "",
+                                           timeout: Optional[float] = None) -> Tuple[List[str], bool]:
+    """Enhanced certification detection using USDA API and text analysis
+    
+    Returns the certifications and whether the USDA check answered. When it
+    timed out or its upstream was unavailable only text-based certifications
+    are returned, and callers shouldn't cache them.
+    """
     certifications = []
+    usda_checked = False
     
-    # First, check USDA Organic Integrity Database with timeout
+    # First, check USDA Organic Integrity Database within the stage budget
     try:
-        # Add timeout to prevent hanging
-        import asyncio
         usda_certs = await asyncio.wait_for(
             lookup_usda_organic_certification(product_name, brand), 
-            timeout=5.0
+            timeout=CERTIFICATION_STAGE_TIMEOUT if timeout is None else timeout
         )
         certifications.extend(usda_certs)
+        usda_checked = True
     except asyncio.TimeoutError:
         logger.warning("USDA API check timed out")
     except Exception as e:
@@ -192,124 +991,401 @@ async def enhanced_certification_detection(product_name: str, brand: str = None,
                 continue
             certifications.append(cert)
     
-    return certifications
+    return certifications, usda_checked
 
+async def search_organic_integrity(term: str, usda_api_key: str) -> bool:
+    """Return True if an Organic Integrity Database search for `term` indicates certification"""
+    # USDA Organic Integrity Database API endpoint
+    base_url = "https://organic.ams.usda.gov/integrity/api/search"
+    
+    try:
+        response = await upstream_get(
+            "usda_organic",
+            base_url,
+            params={
+                "q": term,
+                "api_key": usda_api_key,
+                "limit": 10
+            }
+        )
+        
+        if response.status_code == 200:
+            try:
+                data = fastjson.loads(response.content)
+            except fastjson.JSONDecodeError as e:
+                logger.warning(f"Failed to parse USDA API JSON response for term '{term}': {e}")
+                return False
+            
+            # Check if any results indicate organic certification
+            for result in data.get("results") or []:
+                # Look for organic certification indicators
+                if any(keyword in str(result).lower() for keyword in 
+                      ['organic', 'certified organic', 'usda organic']):
+                    return True
+    
+    except UpstreamUnavailable:
+        raise
+    except Exception as e:
+        logger.warning(f"USDA API request failed for term '{term}': {e}")
+    
+    return False
+
+@cached_lookup(
+    organic_certification_cache,
+    lambda product_name, brand=None: ((product_name or "").strip().lower(), (brand or "").strip().lower())
+)
 async def lookup_usda_organic_certification(product_name: str, brand: str = None) -> List[str]:
     """Check USDA Organic Integrity Database for organic certification"""
     try:
-        usda_api_key = os.environ.get('USDA_ORGANIC_API_KEY')
-        if not usda_api_key:
-            return []
-        
-        # USDA Organic Integrity Database API endpoint
-        base_url = "https://organic.ams.usda.gov/integrity/api/search"
-        
         # Search parameters
         search_terms = [product_name]
         if brand:
             search_terms.append(brand)
         
-        certifications = []
+        # Local index of certified operations, if imported. Brands may match
+        # by prefix or fuzzily; product names only exactly, since generic
+        # names prefix-match unrelated operations ("Peanut Butter & Co")
+        if organic_index is not None:
+            index_terms = [(product_name, True)] + ([(brand, False)] if brand else [])
+            for term, exact in index_terms:
+                match = organic_index.match(term, exact=exact)
+                if match:
+                    organic_index_stats["matches"] += 1
+                    logger.info(f"Organic index matched '{term}' to '{match[0]}' ({match[1]:.2f})")
+                    return ["USDA Organic"]
+            organic_index_stats["misses"] += 1
+            if not ORGANIC_INDEX_REMOTE_FALLBACK:
+                return []
         
-        for term in search_terms:
-            try:
-                async with httpx.AsyncClient() as client:
-                    response = await client.get(
-                        base_url,
-                        params={
-                            "q": term,
-                            "api_key": usda_api_key,
-                            "limit": 10
-                        },
-                        timeout=10.0
-                    )
-                    
-                    if response.status_code == 200:
-                        try:
-                            data = response.json()
-                            
-                            # Check if any results indicate organic certification
-                            if "results" in data and data["results"]:
-                                for result in data["results"]:
-                                    # Look for organic certification indicators
-                                    if any(keyword in str(result).lower() for keyword in 
-                                          ['organic', 'certified organic', 'usda organic']):
-                                        if "USDA Organic" not in certifications:
-                                            certifications.append("USDA Organic")
-                                        break
-                        except (ValueError, json.JSONDecodeError) as e:
-                            logger.warning(f"Failed to parse USDA API JSON response for term '{term}': {e}")
-                            continue
-                    
-            except Exception as e:
-                logger.warning(f"USDA API request failed for term '{term}': {e}")
-                continue
+        usda_api_key = os.environ.get('USDA_ORGANIC_API_KEY')
+        if not usda_api_key:
+            return []
+        
+        # Query every term in parallel over the shared client
+        matches = await asyncio.gather(*[
+            search_organic_integrity(term, usda_api_key) for term in search_terms
+        ], return_exceptions=True)
         
-        return certifications
+        if any(match is True for match in matches):
+            return ["USDA Organic"]
         
+        # Don't report (and cache) "not certified" when the upstream wasn't reachable
+        for match in matches:
+            if isinstance(match, BaseException):
+                raise match
+        return []
+        
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error checking USDA organic certification: {e}")
         return []
 
+@cached_lookup(openfoodfacts_cache, lambda barcode: normalize_barcode(barcode))
 async def lookup_openfoodfacts_by_barcode(barcode: str) -> Optional[Dict[str, Any]]:
     """Lookup product information by barcode using OpenFoodFacts API as fallback"""
     try:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(f"https://world.openfoodfacts.org/api/v0/product/{barcode}.json")
-            if response.status_code == 200:
-                data = response.json()
-                if data.get("status") == 1:
-                    product = data.get("product", {})
-                    ingredients_text = product.get("ingredients_text", "")
-                    
-                    # Parse ingredients
-                    ingredients = []
-                    if ingredients_text:
-                        ingredients = [ing.strip() for ing in re.split(r'[,;]', ingredients_text) if ing.strip()]
-                    
-                    return {
-                        "name": product.get("product_name", "Unknown Product"),
-                        "brand": product.get("brands", "").split(",")[0] if product.get("brands") else None,
-                        "ingredients": ingredients,
-                        "image_url": product.get("image_url"),
-                        "ingredients_text": ingredients_text,
-                        "labels": product.get("labels", ""),
-                        "source": "OpenFoodFacts"
-                    }
+        response = await upstream_get(
+            "openfoodfacts",
+            f"https://world.openfoodfacts.org/api/v2/product/{barcode}",
+            params={"fields": OPENFOODFACTS_FIELDS}
+        )
+        if response.status_code == 200:
+            data = fastjson.loads(response.content)
+            if data.get("status") == 1:
+                return map_openfoodfacts_product(data.get("product", {}))
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error looking up OpenFoodFacts barcode {barcode}: {e}")
     
     return None
 
-async def comprehensive_product_lookup(barcode: str) -> Optional[Dict[str, Any]]:
-    """Comprehensive product lookup using both USDA FoodData Central and OpenFoodFacts"""
-    product_info = None
+def lookup_catalog_product(barcode: str) -> Optional[Dict[str, Any]]:
+    """Lookup a barcode in the memory-mapped product catalog"""
+    if product_catalog is None:
+        return None
+    try:
+        product_info = product_catalog.get(barcode)
+    except Exception as e:
+        catalog_stats["errors"] += 1
+        logger.warning(f"Catalog lookup failed for barcode {barcode}: {e}")
+        return None
     
-    # First, try USDA FoodData Central API
+    if product_info:
+        catalog_stats["hits"] += 1
+    else:
+        catalog_stats["misses"] += 1
+    return product_info
+
+def lookup_local_product(barcode: str) -> Optional[Dict[str, Any]]:
+    """Lookup a barcode in the local store imported from bulk dumps (no network).
+    
+    An exact FDC Branded Foods GTIN match is preferred over OpenFoodFacts, the
+    same merge policy as the remote lookup.
+    """
+    if local_product_store is None:
+        return None
+    try:
+        product_info = (local_product_store.get_fdc_branded(barcode)
+                        or local_product_store.get_openfoodfacts(barcode))
+    except Exception as e:
+        local_store_stats["errors"] += 1
+        logger.warning(f"Local store lookup failed for barcode {barcode}: {e}")
+        return None
+    
+    if product_info:
+        local_store_stats["hits"] += 1
+    else:
+        local_store_stats["misses"] += 1
+    return product_info
+
+async def get_cached_product(barcode: str) -> Optional[Dict[str, Any]]:
+    """Read a product cache entry by barcode (single indexed read)"""
+    try:
+        return await db.product_cache.find_one({"barcode": barcode}, {"_id": 0})
+    except Exception as e:
+        product_cache_stats["errors"] += 1
+        logger.warning(f"Product cache read failed for barcode {barcode}: {e}")
+        return None
+
+async def store_cached_product(barcode: str, product_info: Dict[str, Any],
+                               certifications: Optional[List[str]] = None) -> None:
+    """Upsert a product cache entry with fresh refresh/expiry timestamps"""
+    now = datetime.utcnow()
+    update = {
+        "$set": {
+            "barcode": barcode,
+            "product_info": product_info,
+            "cached_at": now,
+            "refresh_at": now + timedelta(seconds=PRODUCT_CACHE_REFRESH_SECONDS),
+            "expires_at": now + timedelta(seconds=PRODUCT_CACHE_EXPIRE_SECONDS),
+        }
+    }
+    if certifications is not None:
+        update["$set"]["certifications"] = certifications
+    else:
+        # Certifications belong to the old product info; recompute on next scan
+        update["$unset"] = {"certifications": ""}
+    try:
+        await db.product_cache.update_one({"barcode": barcode}, update, upsert=True)
+        product_cache_stats["writes"] += 1
+    except Exception as e:
+        product_cache_stats["errors"] += 1
+        logger.warning(f"Product cache write failed for barcode {barcode}: {e}")
+
+async def store_cached_certifications(barcode: str, certifications: List[str]) -> None:
+    """Attach certifications to an existing product cache entry"""
     try:
-        product_info = await lookup_usda_fooddata_central(f"UPC {barcode}", barcode)
-        if product_info:
-            product_info["source"] = "USDA FoodData Central"
-            logger.info(f"Found product in USDA FDC: {product_info['name']}")
+        await db.product_cache.update_one(
+            {"barcode": barcode},
+            {"$set": {"certifications": certifications}}
+        )
     except Exception as e:
-        logger.warning(f"USDA FoodData Central lookup failed: {e}")
+        product_cache_stats["errors"] += 1
+        logger.warning(f"Product cache certification write failed for barcode {barcode}: {e}")
+
+def serve_cached_product(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Update hit and age counters and return the cached product info"""
+    age = (datetime.utcnow() - entry["cached_at"]).total_seconds()
+    product_cache_stats["hit_age_seconds_total"] += age
+    product_cache_stats["hit_age_seconds_max"] = max(product_cache_stats["hit_age_seconds_max"], age)
     
-    # If USDA didn't return results or UPC doesn't match exactly, try OpenFoodFacts
-    if not product_info or not product_info.get("upc_match", False):
+    product_info = dict(entry["product_info"])
+    if "certifications" in entry:
+        product_info["certifications"] = entry["certifications"]
+    return product_info
+
+def schedule_product_refresh(barcode: str) -> bool:
+    """Queue a background refresh for a stale barcode; False if refreshing isn't running"""
+    if product_refresh_queue is None:
+        return False
+    if barcode in product_refresh_pending:
+        return True
+    try:
+        product_refresh_queue.put_nowait(barcode)
+    except asyncio.QueueFull:
+        product_refresh_stats["dropped"] += 1
+        return True
+    product_refresh_pending.add(barcode)
+    product_refresh_stats["queued"] += 1
+    return True
+
+def schedule_catalog_refresh(barcode: str) -> None:
+    """Queue a refresh for a catalog barcode at most once per refresh window
+    
+    Catalog hits never read the product cache, so this keeps the entry the
+    next catalog build copies from current.
+    """
+    now = time.monotonic()
+    if now - catalog_refresh_queued.get(barcode, float("-inf")) < PRODUCT_CACHE_REFRESH_SECONDS:
+        return
+    catalog_refresh_queued[barcode] = now
+    schedule_product_refresh(barcode)
+
+async def refresh_cached_product(barcode: str) -> None:
+    """Re-run the upstream lookup and certification detection for a cached barcode"""
+    cached = await get_cached_product(barcode)
+    if cached and cached.get("refresh_at") and cached["refresh_at"] > datetime.utcnow():
+        # Refreshed since it was queued, or queued by a catalog hit while fresh
+        product_refresh_stats["fresh"] += 1
+        return
+    
+    product_info = await lookup_product_from_upstreams(barcode)
+    if not product_info:
+        # Keep serving the stale entry; the next scan will queue another refresh
+        product_refresh_stats["unchanged"] += 1
+        return
+    
+    certifications, usda_checked = await enhanced_certification_detection(
+        product_name=product_info["name"],
+        brand=product_info.get("brand"),
+        text=product_info.get("ingredients_text", "") + " " + product_info.get("labels", "")
+    )
+    if not usda_checked:
+        # Don't replace certifications with a partial list during a USDA outage
+        certifications = cached.get("certifications") if cached else None
+    await store_cached_product(barcode, product_info, certifications)
+    product_refresh_stats["refreshed"] += 1
+
+async def product_refresh_worker() -> None:
+    """Drain the refresh queue; the number of workers bounds refresh concurrency"""
+    # Refreshes queue behind interactive scans for outbound rate limit tokens
+    upstream_priority.set(PRIORITY_BACKGROUND)
+    while True:
+        barcode = await product_refresh_queue.get()
         try:
-            openfood_info = await lookup_openfoodfacts_by_barcode(barcode)
-            if openfood_info:
-                # If we have USDA data but no UPC match, prefer OpenFoodFacts for barcode scans
-                if not product_info or not product_info.get("upc_match", False):
-                    product_info = openfood_info
-                    logger.info(f"Using OpenFoodFacts data: {product_info['name']}")
+            await refresh_cached_product(barcode)
+        except asyncio.CancelledError:
+            raise
         except Exception as e:
-            logger.warning(f"OpenFoodFacts lookup failed: {e}")
+            product_refresh_stats["failed"] += 1
+            logger.warning(f"Background refresh failed for barcode {barcode}: {e}")
+        finally:
+            product_refresh_pending.discard(barcode)
+            product_refresh_queue.task_done()
+
+async def comprehensive_product_lookup(barcode: str,
+                                       timeout: Optional[float] = None) -> Tuple[Optional[Dict[str, Any]], Optional[str]]:
+    """Comprehensive product lookup, served from the catalog, local store or product cache when possible
+    
+    Returns the product info and where it came from: "catalog", "local_store",
+    "product_cache" or "upstream" (None if nothing was found). Only the last
+    two have a product cache entry.
+    """
+    barcode = normalize_barcode(barcode)
+    
+    catalog_info = lookup_catalog_product(barcode)
+    if catalog_info:
+        schedule_catalog_refresh(barcode)
+        return catalog_info, "catalog"
+    
+    local_info = lookup_local_product(barcode)
+    if local_info:
+        logger.info(f"Local store hit for barcode {barcode}")
+        return local_info, "local_store"
+    
+    cached = await get_cached_product(barcode)
+    if cached and cached.get("refresh_at") and cached["refresh_at"] > datetime.utcnow():
+        product_cache_stats["hits"] += 1
+        logger.info(f"Product cache hit for barcode {barcode}")
+        return serve_cached_product(cached), "product_cache"
+    
+    if cached:
+        product_cache_stats["stale"] += 1
+        # Stale-while-revalidate: answer now, refresh in the background
+        if schedule_product_refresh(barcode):
+            product_cache_stats["stale_served"] += 1
+            logger.info(f"Serving stale cache entry for barcode {barcode}, refresh queued")
+            return serve_cached_product(cached), "product_cache"
+    else:
+        product_cache_stats["misses"] += 1
+    
+    product_info = await lookup_product_from_upstreams(barcode, timeout=timeout)
     
+    if product_info:
+        await store_cached_product(barcode, product_info)
+        return product_info, "upstream"
+    if cached:
+        # Upstreams came back empty or unavailable; a stale entry is better than nothing
+        product_cache_stats["stale_served"] += 1
+        logger.info(f"Serving stale cache entry for barcode {barcode}")
+        return serve_cached_product(cached), "product_cache"
+    
+    return None, None
+
+async def lookup_fdc_by_barcode(barcode: str) -> Optional[Dict[str, Any]]:
+    """Lookup a barcode in USDA FoodData Central"""
+    product_info = await lookup_usda_fooddata_central(barcode=barcode)
+    if product_info:
+        product_info["source"] = "USDA FoodData Central"
+        logger.info(f"Found product in USDA FDC: {product_info['name']}")
     return product_info
 
-async def lookup_usda_fooddata_central(query: str, barcode: str = None) -> Optional[Dict[str, Any]]:
-    """Lookup product information using USDA FoodData Central API"""
+async def lookup_product_from_upstreams(barcode: str, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+    """Query USDA FoodData Central and OpenFoodFacts concurrently and merge the results.
+    
+    A UPC-matched FDC record is authoritative and returned as soon as it arrives,
+    cancelling the OpenFoodFacts request. Otherwise OpenFoodFacts is preferred,
+    falling back to an unmatched FDC record. Once OpenFoodFacts has answered, FDC
+    gets at most LOOKUP_FDC_GRACE_SECONDS more to produce a UPC match. Whatever
+    has arrived when `timeout` runs out is used.
+    """
+    fdc_task = asyncio.create_task(lookup_fdc_by_barcode(barcode))
+    openfood_task = asyncio.create_task(lookup_openfoodfacts_by_barcode(barcode))
+    sources = {fdc_task: "USDA FoodData Central", openfood_task: "OpenFoodFacts"}
+    
+    deadline = Deadline(timeout) if timeout is not None else None
+    fdc_info = None
+    openfood_info = None
+    pending = {fdc_task, openfood_task}
+    try:
+        while pending:
+            wait = LOOKUP_FDC_GRACE_SECONDS if openfood_info and fdc_task in pending else None
+            if deadline:
+                wait = deadline.remaining() if wait is None else min(wait, deadline.remaining())
+            done, pending = await asyncio.wait(pending, timeout=wait, return_when=asyncio.FIRST_COMPLETED)
+            if not done:
+                logger.info(f"Upstream lookup budget expired for barcode {barcode}; using results so far")
+                break
+            
+            for task in done:
+                try:
+                    result = task.result()
+                except Exception as e:
+                    logger.warning(f"{sources[task]} lookup failed: {e}")
+                    continue
+                if task is fdc_task:
+                    fdc_info = result
+                else:
+                    openfood_info = result
+            
+            if fdc_info and fdc_info.get("upc_match", False):
+                break
+    finally:
+        for task in pending:
+            task.cancel()
+    
+    if fdc_info and fdc_info.get("upc_match", False):
+        return fdc_info
+    
+    # Without a UPC match, prefer OpenFoodFacts for barcode scans
+    if openfood_info:
+        logger.info(f"Using OpenFoodFacts data: {openfood_info['name']}")
+        return openfood_info
+    
+    return fdc_info
+
+@cached_lookup(
+    fooddata_central_cache,
+    lambda query=None, barcode=None: ("barcode", normalize_barcode(barcode)) if barcode else ("query", query.strip().lower())
+)
+async def lookup_usda_fooddata_central(query: Optional[str] = None, barcode: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """Lookup product information using USDA FoodData Central API
+    
+    Searches Branded foods by GTIN/UPC when `barcode` is given, otherwise
+    runs a free-text search for `query`.
+    """
     try:
         usda_fdc_api_key = os.environ.get('USDA_FDC_API_KEY')
         if not usda_fdc_api_key:
@@ -322,119 +1398,250 @@ async def lookup_usda_fooddata_central(query: str, barcode: str = None) -> Optio
             "api_key": usda_fdc_api_key,
             "query": query,
             "dataType": ["Branded", "Foundation", "SR Legacy"],  # Include all relevant data types
-            "pageSize": 10
+            "pageSize": FDC_SEARCH_PAGE_SIZE
         }
         
-        # If barcode is provided, add it to search
+        # A barcode replaces the text query and searches Branded foods by
+        # UPC/GTIN; only those carry a gtinUpc
         if barcode:
-            # Also search by UPC/GTIN
-            params["query"] = f"{query} {barcode}"
+            params["query"] = normalize_barcode(barcode)
+            params["dataType"] = ["Branded"]
+        
+        response = await upstream_get("usda_fdc", base_url, params=params)
         
-        async with httpx.AsyncClient() as client:
-            response = await client.get(base_url, params=params, timeout=10.0)
+        if response.status_code == 200:
+            data = fastjson.loads(response.content)
+            foods = data.get("foods") or []
             
-            if response.status_code == 200:
-                data = response.json()
-                
-                if "foods" in data and data["foods"]:
-                    # Get the first (most relevant) result
-                    food_item = data["foods"][0]
-                    
-                    # Extract ingredients from the food item
-                    ingredients = []
-                    ingredients_text = food_item.get("ingredients", "")
-                    
-                    if ingredients_text:
-                        # Parse ingredients similar to OpenFoodFacts
-                        ingredients = [ing.strip() for ing in re.split(r'[,;]', ingredients_text) if ing.strip()]
-                    
-                    # Extract brand and product name
-                    brand = food_item.get("brandOwner", food_item.get("marketCountry", None))
-                    product_name = food_item.get("description", "Unknown Product")
-                    
-                    # Check if UPC/GTIN matches the barcode
-                    upc_match = barcode and food_item.get("gtinUpc") == barcode
-                    
-                    return {
-                        "name": product_name,
-                        "brand": brand,
-                        "ingredients": ingredients,
-                        "ingredients_text": ingredients_text,
-                        "fdc_id": food_item.get("fdcId"),
-                        "data_type": food_item.get("dataType"),
-                        "upc_match": upc_match,
-                        "publication_date": food_item.get("publicationDate"),
-                        "food_nutrients": food_item.get("foodNutrients", [])
-                    }
-                    
+            if foods:
+                # Prefer a result whose GTIN/UPC matches the barcode, else the
+                # most relevant one; upc_match records which it was
+                products = [map_fdc_food(food_item, barcode) for food_item in foods]
+                return next((product for product in products if product["upc_match"]), products[0])
+        
         return None
         
+    except UpstreamUnavailable:
+        raise
     except Exception as e:
         logger.error(f"Error looking up USDA FoodData Central: {e}")
         return None
 
+async def resolve_barcode_product(barcode: str) -> Dict[str, Any]:
+    """Lookup product info and certifications for a barcode within SCAN_DEADLINE_SECONDS"""
+    deadline = Deadline(SCAN_DEADLINE_SECONDS)
+    
+    # Lookup product info using comprehensive lookup
+    product_info, origin = await comprehensive_product_lookup(barcode, timeout=deadline.budget(LOOKUP_STAGE_SHARE))
+    
+    if not product_info:
+        # Create basic product info if lookup fails
+        product_info = {
+            "name": f"Product {barcode}",
+            "brand": None,
+            "ingredients": [],
+            "image_url": None,
+            "ingredients_text": "",
+            "labels": "",
+            "source": PLACEHOLDER_SOURCE
+        }
+    
+    # Catalog records and product cache entries carry previously detected certifications
+    certifications = product_info.get("certifications")
+    if certifications is None:
+        # Enhanced certification detection using USDA API
+        certifications, usda_checked = await enhanced_certification_detection(
+            product_name=product_info["name"],
+            brand=product_info.get("brand"),
+            text=product_info.get("ingredients_text", "") + " " + product_info.get("labels", ""),
+            timeout=deadline.budget(cap=CERTIFICATION_STAGE_TIMEOUT)
+        )
+        # Only product cache entries keep certifications; catalog and local
+        # store hits (and generated placeholders) have no entry to update.
+        # Partial results are recomputed on the next scan instead.
+        if usda_checked and origin in ("product_cache", "upstream"):
+            await store_cached_certifications(barcode, certifications)
+    
+    return {"product_info": product_info, "certifications": certifications}
+
 # API Endpoints
+async def run_ocr(image_data: bytes, key: str, phash: Optional[str]) -> Dict[str, Any]:
+    """OCR an image in the worker pool and cache the text, ingredients and line heights
+    
+    The image's pool slot must already be reserved.
+    """
+    results = await ocr_batcher.recognize(image_data, reserved=True)
+    text = " ".join([result[1] for result in results])
+    value = {
+        "text": text,
+        "ingredients": extract_ingredients_from_text(text),
+        # (text, box top, box height) per region, for picking out name and brand
+        "lines": [
+            [result[1], min(y for _, y in result[0]), max(y for _, y in result[0]) - min(y for _, y in result[0])]
+            for result in results
+        ]
+    }
+    await ocr_result_cache.set(key, phash, value)
+    return value
+
+async def ocr_image(image_data: bytes) -> Dict[str, Any]:
+    """OCR text and ingredients for an upload, reusing results for repeated images
+    
+    The caller reserves a pool slot for the image with ocr_pool.reserve(). It
+    is used if the image is OCRed here, and released otherwise (cache hits,
+    and uploads coalesced onto an identical in-flight one).
+    """
+    slot_used = False
+    
+    def start_run():
+        nonlocal slot_used
+        slot_used = True
+        return run_ocr(image_data, key, phash)
+    
+    try:
+        key = hashlib.sha256(image_data).hexdigest()
+        cached = await ocr_result_cache.get(key)
+        if cached is not None:
+            return cached
+        
+        phash = None
+        if OCR_CACHE_PERCEPTUAL:
+            phash = await asyncio.to_thread(perceptual_hash, image_data)
+            cached = ocr_result_cache.get_similar(phash)
+            if cached is not None:
+                return cached
+        
+        ocr_result_cache.counters["misses"] += 1
+        return await ocr_runs.do(key, start_run)
+    finally:
+        if not slot_used:
+            ocr_pool.release()
+
 @api_router.get("/")
 async def root():
     return {"message": "Ingrid MVP API - Ready to scan!"}
 
+@api_router.get("/admin/cache/stats")
+async def get_cache_stats():
+    """Report product cache and in-process lookup cache counters"""
+    stats = dict(product_cache_stats)
+    served = stats["hits"] + stats["stale_served"]
+    lookups = stats["hits"] + stats["misses"] + stats["stale"]
+    stats["hit_ratio"] = round(stats["hits"] / lookups, 4) if lookups else 0.0
+    stats["served_ratio"] = round(served / lookups, 4) if lookups else 0.0
+    stats["avg_hit_age_seconds"] = round(stats["hit_age_seconds_total"] / served, 1) if served else 0.0
+    try:
+        stats["entries"] = await db.product_cache.estimated_document_count()
+    except Exception as e:
+        logger.warning(f"Failed to count product cache entries: {e}")
+        stats["entries"] = None
+    return {
+        "product_cache": stats,
+        "lookup_caches": {cache.name: cache.stats() for cache in lookup_caches},
+        "catalog": dict(catalog_stats, enabled=product_catalog is not None,
+                        products=product_catalog.count if product_catalog else 0),
+        "local_store": dict(local_store_stats, enabled=local_product_store is not None),
+        "organic_index": dict(organic_index_stats, operations=len(organic_index) if organic_index else 0),
+        "background_refresh": dict(
+            product_refresh_stats,
+            queue_depth=product_refresh_queue.qsize() if product_refresh_queue else 0,
+            workers=len(product_refresh_workers)
+        ),
+        "single_flight": {barcode_lookups.name: barcode_lookups.stats()}
+    }
+
+@api_router.get("/admin/upstreams")
+async def get_upstream_stats():
+    """Report circuit breaker and rate limiter state for each upstream"""
+    return {
+        "circuit_breakers": {name: breaker.stats() for name, breaker in circuit_breakers.items()},
+        "rate_limiters": {name: limiter.stats() for name, limiter in rate_limiters.items()}
+    }
+
+def ocr_status() -> Dict[str, Any]:
+    return {
+        "available": OCR_AVAILABLE,
+        "engine": OCR_ENGINE,
+        "state": ocr_pool.state if ocr_pool is not None else "disabled"
+    }
+
+@api_router.get("/health/live")
+async def liveness():
+    """Liveness probe: the process is up and serving requests"""
+    return {"status": "ok"}
+
+@api_router.get("/health/ready")
+async def readiness():
+    """Readiness probe: MongoDB is reachable (and OCR is loaded, if required)"""
+    try:
+        await asyncio.wait_for(db.command("ping"), timeout=READINESS_TIMEOUT_SECONDS)
+        database = "ok"
+    except Exception as e:
+        database = f"unavailable: {e}"
+    
+    ocr = ocr_status()
+    ready = database == "ok" and (ocr["state"] == "ready" or not READINESS_REQUIRES_OCR)
+    return FastJSONResponse(
+        {"status": "ready" if ready else "not_ready", "database": database, "ocr": ocr},
+        status_code=200 if ready else 503
+    )
+
+@api_router.get("/admin/ocr")
+async def ocr_stats():
+    """Report OCR pool queue depth and service times"""
+    return {
+        **ocr_status(),
+        "pool": ocr_pool.stats() if ocr_pool is not None else None,
+        "batching": ocr_batcher.stats() if ocr_batcher is not None else None,
+        "cache": ocr_result_cache.stats(),
+        "single_flight": ocr_runs.stats()
+    }
+
 @api_router.post("/scan/barcode", response_model=AnalysisResult)
 async def scan_barcode(request: BarcodeRequest):
     """Scan product by barcode"""
     try:
-        # Lookup product info using comprehensive lookup
-        product_info = await comprehensive_product_lookup(request.barcode)
-        
-        if not product_info:
-            # Create basic product info if lookup fails
-            product_info = {
-                "name": f"Product {request.barcode}",
-                "brand": None,
-                "ingredients": [],
-                "image_url": None,
-                "ingredients_text": "",
-                "labels": "",
-                "source": "Generated"
-            }
+        barcode = normalize_barcode(request.barcode)
+        product_id = str(uuid.uuid4())
+        scan_record = ScanRecord(
+            session_id=request.session_id,
+            product_id=product_id,
+            scan_type="barcode"
+        )
         
-        # Enhanced certification detection using USDA API
-        certifications = await enhanced_certification_detection(
-            product_name=product_info["name"],
-            brand=product_info["brand"],
-            text=product_info.get("ingredients_text", "") + " " + product_info.get("labels", "")
+        # Product lookup and certification detection, shared with any identical
+        # in-flight scans and overlapped with the scan record write and bookmark
+        # check, which don't depend on it
+        resolved, _, bookmark = await asyncio.gather(
+            barcode_lookups.do(barcode, lambda: resolve_barcode_product(barcode)),
+            db.scans.insert_one(scan_record.dict()),
+            db.bookmarks.find_one({
+                "session_id": request.session_id,
+                "product_id": product_id
+            })
         )
+        product_info = resolved["product_info"]
+        certifications = resolved["certifications"]
         
         # Create product record
         ingredient_count = len(product_info["ingredients"])
         rating = calculate_rating(ingredient_count)
         
         product = ProductInfo(
+            id=product_id,
             barcode=request.barcode,
             name=product_info["name"],
-            brand=product_info["brand"],
+            brand=product_info.get("brand"),
             ingredients=product_info["ingredients"],
             ingredient_count=ingredient_count,
             rating=rating,
             certifications=certifications,
-            image_url=product_info["image_url"]
+            image_url=product_info.get("image_url")
         )
         
-        # Save product to database
-        await db.products.insert_one(product.dict())
-        
-        # Record scan
-        scan_record = ScanRecord(
-            session_id=request.session_id,
-            product_id=product.id,
-            scan_type="barcode"
-        )
-        await db.scans.insert_one(scan_record.dict())
-        
-        # Check if bookmarked
-        bookmark = await db.bookmarks.find_one({
-            "session_id": request.session_id,
-            "product_id": product.id
-        })
+        # Save product to database; the source (not part of the API model)
+        # records where the product info came from
+        await db.products.insert_one({**product.dict(), "source": product_info.get("source")})
         
         return AnalysisResult(
             product=product,
@@ -445,115 +1652,70 @@ async def scan_barcode(request: BarcodeRequest):
         logger.error(f"Error scanning barcode: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to scan barcode: {str(e)}")
 
-@api_router.post("/scan/ocr", response_model=AnalysisResult)
-async def scan_ocr(session_id: str = Form(...), image: UploadFile = File(...)):
-    """Scan product by OCR from image"""
-    try:
-        logger.info(f"Starting OCR processing for session: {session_id}")
-        
-        # Check if OCR is available
-        if not OCR_AVAILABLE or ocr_reader is None:
-            logger.warning("OCR not available - returning basic response")
-            # Return basic product info when OCR is not available
-            product = ProductInfo(
-                name="OCR Service Unavailable",
-                ingredients=["OCR processing temporarily unavailable"],
-                ingredient_count=1,
-                rating="amber",
-                certifications=[]
-            )
-            
-            # Save product to database
-            await db.products.insert_one(product.dict())
-            
-            # Record scan
-            scan_record = ScanRecord(
-                session_id=session_id,
-                product_id=product.id,
-                scan_type="ocr"
-            )
-            await db.scans.insert_one(scan_record.dict())
-            
-            return AnalysisResult(
-                product=product,
-                is_bookmarked=False
-            )
-        
-        # Read and process image
-        image_data = await image.read()
-        try:
-            pil_image = Image.open(io.BytesIO(image_data))
-            logger.info("Image loaded successfully, starting OCR...")
-        except Exception as e:
-            logger.error(f"Invalid image file: {e}")
-            # Create minimal product info if image is invalid
-            product = ProductInfo(
-                name="Invalid Image",
-                ingredients=[],
-                ingredient_count=0,
-                rating="green",
-                certifications=[]
-            )
-            
-            # Save product to database
-            await db.products.insert_one(product.dict())
-            
-            # Record scan
-            scan_record = ScanRecord(
-                session_id=session_id,
-                product_id=product.id,
-                scan_type="ocr"
-            )
-            await db.scans.insert_one(scan_record.dict())
-            
-            return AnalysisResult(
-                product=product,
-                is_bookmarked=False
-            )
-        
-        # Perform OCR with timeout protection
-        import asyncio
-        try:
-            # Run OCR in a thread pool to avoid blocking
-            loop = asyncio.get_event_loop()
-            results = await loop.run_in_executor(
-                None, 
-                lambda: ocr_reader.readtext(np.array(pil_image))
-            )
-            text = " ".join([result[1] for result in results])
-            logger.info(f"OCR extracted text length: {len(text)} characters")
-        except Exception as e:
-            logger.error(f"OCR processing failed: {e}")
-            # Create minimal product info if OCR fails
-            text = ""
+async def process_ocr_scan(session_id: str, images: List[bytes], progress=None,
+                           wait_for_pool: bool = False) -> AnalysisResult:
+    """OCR uploaded label images of one product, detect certifications and record the scan
+    
+    With several images, the first is the front of the package: product name
+    and brand are read from its largest text, and the text of all images is
+    merged for ingredients and certifications. `progress`, if given, is
+    awaited with each stage name as it completes: decoded, ocr_done,
+    ingredients_extracted, certifications_done. Raises OCRQueueFull, before
+    any OCR runs, if the OCR pool has no room for every image, unless
+    `wait_for_pool` is set to wait for running jobs to make room.
+    """
+    async def report(stage: str) -> None:
+        if progress is not None:
+            await progress(stage)
+    
+    logger.info(f"Starting OCR processing for session: {session_id}")
+    
+    # Check if OCR is available
+    if not OCR_AVAILABLE or ocr_pool is None:
+        logger.warning("OCR not available - returning basic response")
+        # Return basic product info when OCR is not available
+        product = ProductInfo(
+            name="OCR Service Unavailable",
+            ingredients=["OCR processing temporarily unavailable"],
+            ingredient_count=1,
+            rating="amber",
+            certifications=[]
+        )
         
-        # Extract ingredients and certifications
-        ingredients = extract_ingredients_from_text(text)
-        logger.info(f"Extracted {len(ingredients)} ingredients")
+        # Save product to database
+        await db.products.insert_one(product.dict())
         
-        # Enhanced certification detection for OCR with timeout
-        certifications = await enhanced_certification_detection(
-            product_name="OCR Scanned Product",
-            brand=None,
-            text=text
+        # Record scan
+        scan_record = ScanRecord(
+            session_id=session_id,
+            product_id=product.id,
+            scan_type="ocr"
         )
-        logger.info(f"Detected certifications: {certifications}")
-        
-        # Create product record
-        ingredient_count = len(ingredients)
-        rating = calculate_rating(ingredient_count)
+        await db.scans.insert_one(scan_record.dict())
         
+        return AnalysisResult(
+            product=product,
+            is_bookmarked=False
+        )
+    
+    # Check the image headers; pixels are decoded in the OCR worker
+    try:
+        for image_data in images:
+            Image.open(io.BytesIO(image_data))
+        logger.info(f"{len(images)} image(s) loaded successfully, starting OCR...")
+    except Exception as e:
+        logger.error(f"Invalid image file: {e}")
+        # Create minimal product info if image is invalid
         product = ProductInfo(
-            name="OCR Scanned Product",
-            ingredients=ingredients,
-            ingredient_count=ingredient_count,
-            rating=rating,
-            certifications=certifications
+            name="Invalid Image",
+            ingredients=[],
+            ingredient_count=0,
+            rating="green",
+            certifications=[]
         )
         
         # Save product to database
         await db.products.insert_one(product.dict())
-        logger.info(f"Product saved with ID: {product.id}")
         
         # Record scan
         scan_record = ScanRecord(
@@ -563,23 +1725,275 @@ async def scan_ocr(session_id: str = Form(...), image: UploadFile = File(...)):
         )
         await db.scans.insert_one(scan_record.dict())
         
-        # Check if bookmarked
-        bookmark = await db.bookmarks.find_one({
-            "session_id": session_id,
-            "product_id": product.id
-        })
-        
-        logger.info("OCR processing completed successfully")
-        
         return AnalysisResult(
             product=product,
-            is_bookmarked=bookmark is not None
+            is_bookmarked=False
         )
+    await report("decoded")
+    
+    # Claim a pool slot for every image before any OCR runs, so a scan that
+    # doesn't fit is rejected whole instead of partly running
+    if wait_for_pool:
+        await ocr_pool.acquire(len(images))
+    else:
+        ocr_pool.reserve(len(images))
+    
+    # Decode, preprocess and OCR in the worker pool unless an image was seen
+    # before. Images are submitted together, so they share micro-batches and
+    # run in parallel
+    outputs = await asyncio.gather(*(ocr_image(image_data) for image_data in images), return_exceptions=True)
+    for output in outputs:
+        if isinstance(output, asyncio.CancelledError):
+            raise output
+    for index, output in enumerate(outputs):
+        if isinstance(output, Exception):
+            logger.error(f"OCR processing failed for image {index}: {output}")
+            # Continue with no text for this image if OCR fails
+            outputs[index] = {"text": "", "ingredients": [], "lines": []}
+    
+    # Newlines keep each image's ingredient list from running into the next
+    text = "\n".join(output["text"] for output in outputs)
+    if len(outputs) == 1:
+        ingredients = outputs[0]["ingredients"]
+    else:
+        ingredients = extract_ingredients_from_text(text)
+    logger.info(f"OCR extracted text length: {len(text)} characters")
+    await report("ocr_done")
+    
+    name, brand = None, None
+    if len(outputs) > 1:
+        name, brand = name_and_brand_from_front(outputs[0].get("lines", []))
+        logger.info(f"Front of package reads name={name!r}, brand={brand!r}")
+    name = name or "OCR Scanned Product"
+    
+    logger.info(f"Extracted {len(ingredients)} ingredients")
+    await report("ingredients_extracted")
+    
+    product_id = str(uuid.uuid4())
+    scan_record = ScanRecord(
+        session_id=session_id,
+        product_id=product_id,
+        scan_type="ocr"
+    )
+    
+    # Enhanced certification detection for OCR with timeout, overlapped with
+    # the scan record write and bookmark check
+    (certifications, _), _, bookmark = await asyncio.gather(
+        enhanced_certification_detection(
+            product_name=name,
+            brand=brand,
+            text=text
+        ),
+        db.scans.insert_one(scan_record.dict()),
+        db.bookmarks.find_one({
+            "session_id": session_id,
+            "product_id": product_id
+        })
+    )
+    logger.info(f"Detected certifications: {certifications}")
+    await report("certifications_done")
+    
+    # Create product record
+    ingredient_count = len(ingredients)
+    rating = calculate_rating(ingredient_count)
+    
+    product = ProductInfo(
+        id=product_id,
+        name=name,
+        brand=brand,
+        ingredients=ingredients,
+        ingredient_count=ingredient_count,
+        rating=rating,
+        certifications=certifications
+    )
+    
+    # Save product to database
+    await db.products.insert_one(product.dict())
+    logger.info(f"Product saved with ID: {product.id}")
+    
+    logger.info("OCR processing completed successfully")
+    
+    return AnalysisResult(
+        product=product,
+        is_bookmarked=bookmark is not None
+    )
+
+def ocr_busy_error() -> HTTPException:
+    return HTTPException(
+        status_code=503,
+        detail="OCR service is busy, please retry",
+        headers={"Retry-After": str(ocr_pool.retry_after(OCR_RETRY_AFTER_SECONDS))}
+    )
+
+@api_router.post("/scan/ocr", response_model=AnalysisResult)
+async def scan_ocr(session_id: str = Form(...), image: UploadFile = File(...)):
+    """Scan product by OCR from image"""
+    try:
+        image_data = await image.read()
+        return await process_ocr_scan(session_id, [image_data])
         
+    except OCRQueueFull as e:
+        logger.warning(f"Rejecting OCR scan: {e}")
+        raise ocr_busy_error()
     except Exception as e:
         logger.error(f"Error processing OCR: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to process image: {str(e)}")
 
+@api_router.post("/scan/ocr/multi", response_model=AnalysisResult)
+async def scan_ocr_multi(session_id: str = Form(...), images: List[UploadFile] = File(...)):
+    """Scan one product by OCR from several images, front of package first"""
+    if len(images) > OCR_MAX_IMAGES:
+        raise HTTPException(status_code=400, detail=f"At most {OCR_MAX_IMAGES} images per scan")
+    try:
+        images_data = [await image.read() for image in images]
+        for image_data in images_data:
+            if len(image_data) > OCR_MAX_UPLOAD_BYTES:
+                raise UploadSizeLimit._too_large(OCR_MAX_UPLOAD_BYTES)
+        return await process_ocr_scan(session_id, images_data)
+        
+    except HTTPException:
+        raise
+    except OCRQueueFull as e:
+        logger.warning(f"Rejecting OCR scan: {e}")
+        raise ocr_busy_error()
+    except Exception as e:
+        logger.error(f"Error processing OCR: {e}")
+        raise HTTPException(status_code=500, detail=f"Failed to process images: {str(e)}")
+
+async def update_ocr_job(job_id: str, stage: Optional[str] = None, **fields: Any) -> None:
+    """Record job progress in MongoDB and wake any event streams for the job"""
+    now = datetime.utcnow()
+    update: Dict[str, Any] = {"$set": {**fields, "updated_at": now}}
+    if stage is not None:
+        update["$set"]["stage"] = stage
+        update["$push"] = {"stages": {"stage": stage, "at": now}}
+    await db.ocr_jobs.update_one({"id": job_id}, update)
+    for event in ocr_job_listeners.get(job_id, ()):
+        event.set()
+
+async def run_ocr_job(job_id: str, session_id: str, image_data: bytes) -> None:
+    """Process an OCR job in the background, recording each stage"""
+    try:
+        await update_ocr_job(job_id, status="running")
+        # Accepted jobs queue for the OCR pool instead of failing when it is busy
+        result = await process_ocr_scan(
+            session_id,
+            [image_data],
+            progress=lambda stage: update_ocr_job(job_id, stage=stage),
+            wait_for_pool=True
+        )
+        await update_ocr_job(job_id, status="completed", result=result.dict())
+    except asyncio.CancelledError:
+        await asyncio.shield(update_ocr_job(job_id, status="failed", error="Server shutting down"))
+        raise
+    except Exception as e:
+        logger.error(f"Error processing OCR job {job_id}: {e}")
+        await update_ocr_job(job_id, status="failed", error=f"Failed to process image: {str(e)}")
+
+@api_router.post("/scan/ocr/jobs", status_code=202)
+async def create_ocr_job(session_id: str = Form(...), image: UploadFile = File(...)):
+    """Start an OCR scan in the background and return its job id immediately
+    
+    Jobs wait for room in the OCR pool, so a busy pool delays them rather
+    than failing them; only OCR_JOB_MAX_ACTIVE bounds how many are accepted.
+    """
+    if len(ocr_job_tasks) >= OCR_JOB_MAX_ACTIVE:
+        raise HTTPException(
+            status_code=503,
+            detail="Too many OCR jobs in progress, please retry",
+            headers={"Retry-After": str(OCR_RETRY_AFTER_SECONDS)}
+        )
+    
+    image_data = await image.read()
+    job_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+    await db.ocr_jobs.insert_one({
+        "id": job_id,
+        "session_id": session_id,
+        "status": "queued",
+        "stage": None,
+        "stages": [],
+        "result": None,
+        "error": None,
+        "created_at": now,
+        "updated_at": now,
+        "expires_at": now + timedelta(seconds=OCR_JOB_TTL_SECONDS)
+    })
+    
+    task = asyncio.create_task(run_ocr_job(job_id, session_id, image_data))
+    ocr_job_tasks[job_id] = task
+    task.add_done_callback(lambda done: ocr_job_tasks.pop(job_id, None))
+    
+    return {
+        "id": job_id,
+        "status": "queued",
+        "status_url": f"/api/scan/ocr/jobs/{job_id}",
+        "events_url": f"/api/scan/ocr/jobs/{job_id}/events"
+    }
+
+async def get_ocr_job_document(job_id: str) -> Optional[Dict[str, Any]]:
+    return await db.ocr_jobs.find_one({"id": job_id}, OCR_JOB_PROJECTION)
+
+@api_router.get("/scan/ocr/jobs/{job_id}")
+async def get_ocr_job(job_id: str):
+    """Poll an OCR job's status, stages so far and result"""
+    job = await get_ocr_job_document(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return job
+
+def sse_event(event: str, data: Any) -> bytes:
+    return b"event: " + event.encode() + b"\ndata: " + fastjson.dumps(data) + b"\n\n"
+
+async def ocr_job_events(job_id: str, job: Dict[str, Any]):
+    """Server-sent events for each stage of a job, then a completed or failed event
+    
+    Jobs running in this process wake the stream as they progress; jobs
+    running in another worker are picked up by polling.
+    """
+    wakeup = asyncio.Event()
+    ocr_job_listeners.setdefault(job_id, set()).add(wakeup)
+    sent = 0
+    try:
+        while True:
+            for stage in job["stages"][sent:]:
+                yield sse_event("stage", stage)
+            sent = len(job["stages"])
+            
+            if job["status"] in ("completed", "failed"):
+                yield sse_event(job["status"], job)
+                return
+            
+            try:
+                await asyncio.wait_for(wakeup.wait(), timeout=OCR_JOB_EVENT_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                # Keeps proxies from closing an idle stream
+                yield b": keepalive\n\n"
+            wakeup.clear()
+            
+            job = await get_ocr_job_document(job_id)
+            if job is None:
+                yield sse_event("failed", {"id": job_id, "error": "OCR job expired"})
+                return
+    finally:
+        listeners = ocr_job_listeners.get(job_id)
+        if listeners is not None:
+            listeners.discard(wakeup)
+            if not listeners:
+                del ocr_job_listeners[job_id]
+
+@api_router.get("/scan/ocr/jobs/{job_id}/events")
+async def stream_ocr_job(job_id: str):
+    """Stream an OCR job's progress as server-sent events"""
+    job = await get_ocr_job_document(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="OCR job not found")
+    return StreamingResponse(
+        ocr_job_events(job_id, job),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @api_router.post("/bookmarks/toggle")
 async def toggle_bookmark(session_id: str, product_id: str):
     """Toggle bookmark status for a product"""
@@ -617,7 +2031,7 @@ async def get_scan_history(session_id: str):
         results = []
         for scan in scans:
             # Get product info
-            product = await db.products.find_one({"id": scan["product_id"]})
+            product = await db.products.find_one({"id": scan["product_id"]}, PRODUCT_PROJECTION)
             if product:
                 # Check if bookmarked
                 bookmark = await db.bookmarks.find_one({
@@ -625,12 +2039,11 @@ async def get_scan_history(session_id: str):
                     "product_id": scan["product_id"]
                 })
                 
-                results.append(AnalysisResult(
-                    product=ProductInfo(**product),
-                    is_bookmarked=bookmark is not None
-                ))
+                results.append({"product": product, "is_bookmarked": bookmark is not None})
         
-        return results
+        # Stored products were written from ProductInfo, so they are rendered
+        # as-is rather than re-validated through the response model
+        return FastJSONResponse(results)
         
     except Exception as e:
         logger.error(f"Error getting history: {e}")
@@ -646,14 +2059,11 @@ async def get_bookmarks(session_id: str):
         results = []
         for bookmark in bookmarks:
             # Get product info
-            product = await db.products.find_one({"id": bookmark["product_id"]})
+            product = await db.products.find_one({"id": bookmark["product_id"]}, PRODUCT_PROJECTION)
             if product:
-                results.append(AnalysisResult(
-                    product=ProductInfo(**product),
-                    is_bookmarked=True
-                ))
+                results.append({"product": product, "is_bookmarked": True})
         
-        return results
+        return FastJSONResponse(results)
         
     except Exception as e:
         logger.error(f"Error getting bookmarks: {e}")
@@ -662,6 +2072,12 @@ async def get_bookmarks(session_id: str):
 # Include router
 app.include_router(api_router)
 
+# Reject oversized OCR uploads before they are parsed
+app.add_middleware(UploadSizeLimit, limits={
+    "/api/scan/ocr": OCR_MAX_UPLOAD_BYTES,
+    "/api/scan/ocr/multi": OCR_MAX_UPLOAD_BYTES * OCR_MAX_IMAGES
+})
+
 # CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -671,6 +2087,162 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.on_event("startup")
+async def create_indexes():
+    """Ensure indexes backing the product cache exist"""
+    try:
+        await db.product_cache.create_index("barcode", unique=True)
+        await db.product_cache.create_index("expires_at", expireAfterSeconds=0)
+    except Exception as e:
+        logger.warning(f"Failed to create product cache indexes: {e}")
+
+@app.on_event("startup")
+async def create_ocr_job_indexes():
+    """Index OCR jobs by id and expire them after OCR_JOB_TTL_SECONDS"""
+    try:
+        await db.ocr_jobs.create_index("id", unique=True)
+        await db.ocr_jobs.create_index("expires_at", expireAfterSeconds=0)
+    except Exception as e:
+        logger.warning(f"Failed to create OCR job indexes: {e}")
+
+@app.on_event("startup")
+async def open_ocr_cache():
+    """Create the capped OCR cache collection and warm the in-memory cache from it"""
+    try:
+        if ocr_result_cache.collection_name not in await db.list_collection_names():
+            await db.create_collection(ocr_result_cache.collection_name, capped=True, size=OCR_CACHE_MAX_BYTES)
+        await ocr_result_cache.collection.create_index("key")
+        loaded = await ocr_result_cache.load()
+        if loaded:
+            logger.info(f"Loaded {loaded} cached OCR results")
+    except Exception as e:
+        logger.warning(f"Failed to prepare OCR cache: {e}")
+
+@app.on_event("startup")
+async def open_product_catalog():
+    """Map the product catalog read-only if it has been built"""
+    global product_catalog
+    if not Path(CATALOG_PATH).exists():
+        return
+    try:
+        product_catalog = ProductCatalog(CATALOG_PATH)
+        logger.info(f"Mapped product catalog at {CATALOG_PATH} ({product_catalog.count} products)")
+    except Exception as e:
+        logger.warning(f"Failed to map product catalog at {CATALOG_PATH}: {e}")
+
+@app.on_event("startup")
+async def open_local_store():
+    """Open the local barcode store read-only and load the organic index if imported"""
+    global local_product_store
+    if not Path(LOCAL_STORE_PATH).exists():
+        logger.info(f"No local product store at {LOCAL_STORE_PATH}; using remote lookups only")
+        return
+    try:
+        local_product_store = LocalProductStore(LOCAL_STORE_PATH, read_only=True)
+        logger.info(f"Opened local product store at {LOCAL_STORE_PATH}")
+    except Exception as e:
+        logger.warning(f"Failed to open local product store at {LOCAL_STORE_PATH}: {e}")
+        return
+    
+    global organic_index
+    try:
+        organic_index = await asyncio.to_thread(load_organic_index, local_product_store)
+        if organic_index is not None:
+            logger.info(f"Loaded {len(organic_index)} certified organic operations")
+    except Exception as e:
+        logger.warning(f"Failed to load organic operations index: {e}")
+
+@app.on_event("startup")
+async def open_upstream_clients():
+    """Open one pooled HTTP client per upstream for the life of the app"""
+    for upstream in UPSTREAMS:
+        get_upstream_client(upstream)
+
+@app.on_event("startup")
+async def start_product_refresh_workers():
+    """Start the bounded background refresh queue for stale cache entries"""
+    global product_refresh_queue
+    if PRODUCT_REFRESH_WORKERS <= 0:
+        return
+    product_refresh_queue = asyncio.Queue(maxsize=PRODUCT_REFRESH_QUEUE_SIZE)
+    for _ in range(PRODUCT_REFRESH_WORKERS):
+        product_refresh_workers.append(asyncio.create_task(product_refresh_worker()))
+
+async def load_ocr_pool() -> None:
+    """Wait for the OCR workers to load and warm up; disable OCR if they can't"""
+    global OCR_AVAILABLE
+    if not await ocr_pool.start():
+        OCR_AVAILABLE = False
+        logger.warning(f"OCR engine {OCR_ENGINE} not available: {ocr_pool.error}. OCR functionality will be disabled.")
+
+@app.on_event("startup")
+async def start_ocr_pool():
+    """Start the OCR worker processes if the OCR engine is installed, without waiting for them"""
+    global ocr_pool, ocr_batcher, ocr_pool_loader, OCR_AVAILABLE
+    if not OCR_ENGINE_AVAILABLE:
+        logger.warning(f"OCR engine {OCR_ENGINE} not available: {ENGINE_MODULES[OCR_ENGINE]} not installed. "
+                       "OCR functionality will be disabled.")
+        return
+    # A multi-image scan reserves a slot per image up front
+    capacity = max(1, OCR_WORKERS) + max(0, OCR_QUEUE_SIZE)
+    if OCR_MAX_IMAGES > capacity:
+        raise RuntimeError(
+            f"OCR_MAX_IMAGES ({OCR_MAX_IMAGES}) exceeds the OCR pool capacity of {capacity} "
+            "(OCR_WORKERS + OCR_QUEUE_SIZE); multi-image scans that large could never run"
+        )
+    try:
+        ocr_pool = OCRPool(OCR_WORKERS, OCR_QUEUE_SIZE, OCR_LANGUAGES, warmup=OCR_WARMUP, engine=OCR_ENGINE)
+        ocr_batcher = OCRBatcher(ocr_pool, OCR_PREPROCESS, OCR_MODE, OCR_BATCH_MAX_SIZE, OCR_BATCH_MAX_WAIT_MS / 1000)
+        OCR_AVAILABLE = True
+        ocr_pool_loader = asyncio.create_task(load_ocr_pool())
+        logger.info(f"Loading {OCR_ENGINE} in {ocr_pool.workers} worker processes")
+    except Exception as e:
+        logger.warning(f"OCR engine {OCR_ENGINE} not available: {e}. OCR functionality will be disabled.")
+
+@app.on_event("shutdown")
+async def stop_product_refresh_workers():
+    global product_refresh_queue
+    for task in product_refresh_workers:
+        task.cancel()
+    await asyncio.gather(*product_refresh_workers, return_exceptions=True)
+    product_refresh_workers.clear()
+    product_refresh_queue = None
+
+@app.on_event("shutdown")
+async def close_upstream_clients():
+    for upstream, http_client in list(upstream_clients.items()):
+        try:
+            await http_client.aclose()
+        except Exception as e:
+            logger.warning(f"Failed to close HTTP client for {upstream}: {e}")
+    upstream_clients.clear()
+
+@app.on_event("shutdown")
+async def close_product_catalog():
+    if product_catalog is not None:
+        product_catalog.close()
+
+@app.on_event("shutdown")
+async def close_local_store():
+    if local_product_store is not None:
+        local_product_store.close()
+
+@app.on_event("shutdown")
+async def cancel_ocr_jobs():
+    tasks = list(ocr_job_tasks.values())
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+@app.on_event("shutdown")
+async def stop_ocr_pool():
+    global OCR_AVAILABLE
+    OCR_AVAILABLE = False
+    if ocr_pool_loader is not None:
+        ocr_pool_loader.cancel()
+    if ocr_pool is not None:
+        ocr_pool.shutdown()
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
     client.close()
\ No newline at end of file
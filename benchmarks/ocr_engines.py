@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""Benchmark OCR engines for latency, memory and ingredient accuracy.
+
+Each engine runs in a fresh process, as in the OCR worker pool, so load time
+and peak resident memory are measured per engine. Every labeled sample (see
+ocr_samples.py) goes through decode, the default preprocessing and
+recognition; latency excludes the model load and a warmup inference.
+
+Usage:
+    python benchmarks/ocr_engines.py path/to/samples [--rounds 3] [--engines easyocr tesseract]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Tuple
+
+from ocr_samples import load_samples, score_ingredients
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import ocr
+from ocr_engines import OCR_ENGINES
+from preprocess import DEFAULT_OPTIONS
+
+def run_engine(engine: str, samples: List[Tuple[str, bytes, List[str]]], rounds: int,
+               mode: str) -> Dict[str, Any]:
+    """Load an engine and time it on every sample (runs in a child process)"""
+    started = time.perf_counter()
+    ocr.init_worker(["en"], warmup=True, engine=engine)
+    load_seconds = time.perf_counter() - started
+
+    latencies, texts = [], []
+    for _, data, _ in samples:
+        for _ in range(rounds):
+            started = time.perf_counter()
+            results = ocr.recognize(data, DEFAULT_OPTIONS, mode)
+            latencies.append(time.perf_counter() - started)
+        texts.append(" ".join(result[1] for result in results))
+    # ru_maxrss is in kilobytes on Linux
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {"load_seconds": load_seconds, "latencies": latencies, "texts": texts, "peak_mb": peak_mb}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("samples", help="Directory with label photos and labels.json")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed runs per sample and engine")
+    parser.add_argument("--engines", nargs="*", choices=sorted(OCR_ENGINES), help="Engines to run (default: all)")
+    parser.add_argument("--mode", choices=sorted(ocr.OCR_MODES), default="full",
+                        help="Recognize everything or only the ingredient block")
+    args = parser.parse_args()
+
+    from server import extract_ingredients_from_text
+
+    samples = load_samples(args.samples)
+    print(f"{len(samples)} samples, {args.rounds} rounds, {args.mode} mode")
+    print(f"{'engine':<10} {'load s':>7} {'peak MB':>8} {'mean ms':>9} {'median ms':>10} "
+          f"{'precision':>10} {'recall':>8} {'f1':>6}")
+    context = multiprocessing.get_context("spawn")
+    for engine in args.engines or OCR_ENGINES:
+        with ProcessPoolExecutor(1, mp_context=context) as executor:
+            try:
+                run = executor.submit(run_engine, engine, samples, args.rounds, args.mode).result()
+            except Exception as e:
+                print(f"{engine:<10} failed: {e}")
+                continue
+        scores = [
+            score_ingredients(extract_ingredients_from_text(text), expected)
+            for text, (_, _, expected) in zip(run["texts"], samples)
+        ]
+        print(f"{engine:<10} {run['load_seconds']:>7.1f} {run['peak_mb']:>8.0f} "
+              f"{statistics.mean(run['latencies']) * 1000:>9.0f} {statistics.median(run['latencies']) * 1000:>10.0f} "
+              f"{statistics.mean(s['precision'] for s in scores):>10.2f} "
+              f"{statistics.mean(s['recall'] for s in scores):>8.2f} "
+              f"{statistics.mean(s['f1'] for s in scores):>6.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
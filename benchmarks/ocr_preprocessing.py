@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""Benchmark OCR latency and ingredient accuracy across preprocessing settings.
+
+Runs each labeled sample (see ocr_samples.py) through decode, preprocessing
+and easyocr recognition in-process, once per variant, and reports mean and
+median latency with ingredient precision/recall/F1 from
+extract_ingredients_from_text.
+
+Usage:
+    python benchmarks/ocr_preprocessing.py path/to/samples [--rounds 3] [--mode ingredients]
+"""
+import argparse
+import os
+import statistics
+import sys
+import time
+
+from ocr_samples import load_samples, score_ingredients
+
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+import ocr
+from server import extract_ingredients_from_text
+
+VARIANTS = {
+    "original": {"max_dimension": 0, "grayscale": False, "contrast": False, "deskew": False},
+    "resize-2400": {"max_dimension": 2400, "grayscale": False, "contrast": False, "deskew": False},
+    "resize-1600": {"max_dimension": 1600, "grayscale": False, "contrast": False, "deskew": False},
+    "default": {"max_dimension": 1600, "grayscale": True, "contrast": True, "deskew": False},
+    "default+deskew": {"max_dimension": 1600, "grayscale": True, "contrast": True, "deskew": True},
+    "resize-1024": {"max_dimension": 1024, "grayscale": True, "contrast": True, "deskew": False},
+}
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("samples", help="Directory with label photos and labels.json")
+    parser.add_argument("--rounds", type=int, default=3, help="Timed runs per sample and variant")
+    parser.add_argument("--variants", nargs="*", choices=sorted(VARIANTS), help="Variants to run (default: all)")
+    parser.add_argument("--mode", choices=sorted(ocr.OCR_MODES), default="full",
+                        help="Recognize everything or only the ingredient block")
+    args = parser.parse_args()
+
+    samples = load_samples(args.samples)
+    ocr.init_worker(["en"], warmup=True)
+
+    print(f"{len(samples)} samples, {args.rounds} rounds, {args.mode} mode")
+    print(f"{'variant':<16} {'mean ms':>9} {'median ms':>10} {'precision':>10} {'recall':>8} {'f1':>6}")
+    for name in args.variants or VARIANTS:
+        options = VARIANTS[name]
+        latencies, scores = [], []
+        for _, data, expected in samples:
+            for _ in range(args.rounds):
+                started = time.perf_counter()
+                results = ocr.recognize(data, options, args.mode)
+                latencies.append(time.perf_counter() - started)
+            text = " ".join(result[1] for result in results)
+            scores.append(score_ingredients(extract_ingredients_from_text(text), expected))
+        print(f"{name:<16} {statistics.mean(latencies) * 1000:>9.0f} {statistics.median(latencies) * 1000:>10.0f} "
+              f"{statistics.mean(s['precision'] for s in scores):>10.2f} "
+              f"{statistics.mean(s['recall'] for s in scores):>8.2f} "
+              f"{statistics.mean(s['f1'] for s in scores):>6.2f}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
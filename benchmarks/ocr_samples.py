@@ -0,0 +1,45 @@
+"""Labeled label-photo samples for the OCR benchmarks.
+
+A sample directory holds the photos plus a labels.json mapping each file name
+to the ingredients a reader would list for it:
+
+    {"granola_back.jpg": ["rolled oats", "honey", "sunflower oil", "sea salt"]}
+
+Extracted ingredients are matched to expected ones by fuzzy string similarity,
+so minor OCR slips ("sunflower 0il") still count.
+"""
+import difflib
+import json
+import re
+import sys
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+if str(BACKEND_DIR) not in sys.path:
+    sys.path.insert(0, str(BACKEND_DIR))
+
+MATCH_THRESHOLD = 0.8
+
+def load_samples(directory: str) -> List[Tuple[str, bytes, List[str]]]:
+    """Return (name, image bytes, expected ingredients) for every labeled photo"""
+    root = Path(directory)
+    labels = json.loads((root / "labels.json").read_text())
+    return [(name, (root / name).read_bytes(), expected) for name, expected in sorted(labels.items())]
+
+def normalize(ingredient: str) -> str:
+    return re.sub(r"[^a-z0-9 ]+", "", ingredient.lower()).strip()
+
+def score_ingredients(extracted: List[str], expected: List[str]) -> Dict[str, float]:
+    """Precision, recall and F1 of extracted against expected ingredients"""
+    remaining = [normalize(item) for item in expected]
+    matched = 0
+    for item in (normalize(item) for item in extracted):
+        best = max(remaining, key=lambda candidate: difflib.SequenceMatcher(None, item, candidate).ratio(), default=None)
+        if best is not None and difflib.SequenceMatcher(None, item, best).ratio() >= MATCH_THRESHOLD:
+            matched += 1
+            remaining.remove(best)
+    precision = matched / len(extracted) if extracted else 0.0
+    recall = matched / len(expected) if expected else 0.0
+    f1 = 2 * precision * recall / (precision + recall) if precision + recall else 0.0
+    return {"precision": precision, "recall": recall, "f1": f1}
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+"""Benchmark rendering a 100-item scan history response.
+
+Compares FastAPI's response_model path (validate AnalysisResult models, dump
+to JSON-compatible data, stdlib json render) with the FastJSONResponse path
+used by /api/history and /api/bookmarks (render projected Mongo documents
+directly).
+
+Usage:
+    python benchmarks/serialize_history.py [--items 100] [--rounds 200]
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+import fastjson
+from server import AnalysisResult, FastJSONResponse, PRODUCT_FIELDS
+
+def make_history(items: int) -> List[dict]:
+    """History entries shaped like projected products documents"""
+    history = []
+    for index in range(items):
+        ingredients = [f"ingredient {n}" for n in range(12)]
+        product = {
+            "id": str(uuid.uuid4()),
+            "barcode": f"{index:013d}",
+            "name": f"Organic Product {index}",
+            "brand": "Brand",
+            "ingredients": ingredients,
+            "ingredient_count": len(ingredients),
+            "rating": "amber",
+            "certifications": ["USDA Organic", "Non-GMO Project Verified"],
+            "image_url": f"https://images.openfoodfacts.org/{index}.jpg",
+            "created_at": datetime.utcnow(),
+        }
+        history.append({"product": {field: product[field] for field in PRODUCT_FIELDS}, "is_bookmarked": index % 3 == 0})
+    return history
+
+def response_model_path(history: List[dict], adapter: TypeAdapter) -> bytes:
+    # What the endpoint did before: build models, then FastAPI validates the
+    # return value against the response model and renders it with json.dumps
+    results = [AnalysisResult(**entry) for entry in history]
+    content = adapter.validate_python([result.model_dump() for result in results])
+    return JSONResponse(adapter.dump_python(content, mode="json")).body
+
+def fast_path(history: List[dict]) -> bytes:
+    return FastJSONResponse(history).body
+
+def timed(func, rounds: int) -> float:
+    started = time.perf_counter()
+    for _ in range(rounds):
+        func()
+    return (time.perf_counter() - started) / rounds
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--items", type=int, default=100, help="History entries per response")
+    parser.add_argument("--rounds", type=int, default=200, help="Timed renders per path")
+    args = parser.parse_args()
+
+    history = make_history(args.items)
+    adapter = TypeAdapter(List[AnalysisResult])
+    before = response_model_path(history, adapter)
+    after = fast_path(history)
+    assert fastjson.loads(before) == fastjson.loads(after), "paths render different JSON"
+
+    before_seconds = timed(lambda: response_model_path(history, adapter), args.rounds)
+    after_seconds = timed(lambda: fast_path(history), args.rounds)
+    print(f"orjson available: {fastjson.ORJSON_AVAILABLE}")
+    print(f"{args.items}-item history, {len(after)} bytes")
+    print(f"  response_model + json:  {before_seconds * 1000:8.3f} ms")
+    print(f"  FastJSONResponse:       {after_seconds * 1000:8.3f} ms  ({before_seconds / after_seconds:.1f}x)")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,119 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+
+PRODUCT = {"name": "Rolled Oats", "brand": "Acme", "ingredients": ["oats"], "ingredients_text": "oats", "labels": ""}
+
+@pytest.fixture
+def lookups(monkeypatch):
+    """Stub every product source and record product and certification cache writes"""
+    sources = {"catalog": None, "local_store": None, "product_cache": None, "upstream": None,
+               "usda_checked": True}
+    written = []
+    stored = []
+
+    async def get_cached_product(barcode):
+        return sources["product_cache"]
+
+    async def lookup_product_from_upstreams(barcode, timeout=None):
+        return sources["upstream"]
+
+    async def store_cached_product(barcode, product_info, certifications=None):
+        stored.append((barcode, certifications))
+
+    async def store_cached_certifications(barcode, certifications):
+        written.append((barcode, certifications))
+
+    async def enhanced_certification_detection(product_name, brand=None, text="", timeout=None):
+        return ["Organic"], sources["usda_checked"]
+
+    monkeypatch.setattr(server, "lookup_catalog_product", lambda barcode: sources["catalog"])
+    monkeypatch.setattr(server, "lookup_local_product", lambda barcode: sources["local_store"])
+    monkeypatch.setattr(server, "get_cached_product", get_cached_product)
+    monkeypatch.setattr(server, "lookup_product_from_upstreams", lookup_product_from_upstreams)
+    monkeypatch.setattr(server, "store_cached_product", store_cached_product)
+    monkeypatch.setattr(server, "store_cached_certifications", store_cached_certifications)
+    monkeypatch.setattr(server, "enhanced_certification_detection", enhanced_certification_detection)
+    return sources, written, stored
+
+def test_local_store_hit_does_not_write_certifications(lookups):
+    sources, written, _ = lookups
+    sources["local_store"] = dict(PRODUCT)
+
+    resolved = asyncio.run(server.resolve_barcode_product("0123"))
+
+    assert resolved["certifications"] == ["Organic"]
+    assert written == []
+
+def test_upstream_result_gets_certifications_cached(lookups):
+    sources, written, _ = lookups
+    sources["upstream"] = dict(PRODUCT)
+
+    asyncio.run(server.resolve_barcode_product("0123"))
+
+    assert written == [("0123", ["Organic"])]
+
+def test_generated_placeholder_does_not_write_certifications(lookups):
+    _, written, _ = lookups
+
+    resolved = asyncio.run(server.resolve_barcode_product("0123"))
+
+    assert resolved["product_info"]["source"] == "Generated"
+    assert written == []
+
+def test_partial_certifications_are_not_cached_when_usda_did_not_answer(lookups):
+    sources, written, _ = lookups
+    sources["upstream"] = dict(PRODUCT)
+    sources["usda_checked"] = False
+
+    resolved = asyncio.run(server.resolve_barcode_product("0123"))
+
+    assert resolved["certifications"] == ["Organic"]
+    assert written == []
+
+def test_refresh_stores_fresh_certifications(lookups):
+    sources, _, stored = lookups
+    sources["upstream"] = dict(PRODUCT)
+    sources["product_cache"] = {"product_info": dict(PRODUCT), "certifications": ["USDA Organic"]}
+
+    asyncio.run(server.refresh_cached_product("0123"))
+
+    assert stored == [("0123", ["Organic"])]
+
+def test_refresh_keeps_certifications_when_usda_did_not_answer(lookups):
+    sources, _, stored = lookups
+    sources["upstream"] = dict(PRODUCT)
+    sources["product_cache"] = {"product_info": dict(PRODUCT), "certifications": ["USDA Organic"]}
+    sources["usda_checked"] = False
+
+    asyncio.run(server.refresh_cached_product("0123"))
+
+    assert stored == [("0123", ["USDA Organic"])]
+
+def test_catalog_hit_queues_one_refresh_per_window(lookups, monkeypatch):
+    sources, written, _ = lookups
+    sources["catalog"] = {**PRODUCT, "certifications": ["USDA Organic"], "source": "Catalog"}
+    queue = asyncio.Queue()
+    monkeypatch.setattr(server, "product_refresh_queue", queue)
+    monkeypatch.setattr(server, "product_refresh_pending", set())
+    monkeypatch.setattr(server, "catalog_refresh_queued", {})
+
+    for _ in range(2):
+        resolved = asyncio.run(server.resolve_barcode_product("0123"))
+        server.product_refresh_pending.clear()
+
+    assert resolved["certifications"] == ["USDA Organic"]
+    assert queue.qsize() == 1
+    assert written == []
+
+def test_refresh_skips_fresh_entries(lookups):
+    sources, _, stored = lookups
+    sources["upstream"] = dict(PRODUCT)
+    sources["product_cache"] = {"product_info": dict(PRODUCT), "refresh_at": datetime.utcnow() + timedelta(hours=1)}
+
+    asyncio.run(server.refresh_cached_product("0123"))
+
+    assert stored == []
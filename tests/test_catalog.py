@@ -0,0 +1,116 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from catalog import ProductCatalog, build_catalog_from_products, write_catalog
+
+mongomock = pytest.importorskip("mongomock")
+
+NOW = datetime(2026, 1, 1)
+
+def scan(barcode, name, minutes_ago, source="OpenFoodFacts"):
+    """A products document, as saved by every barcode scan"""
+    return {
+        "barcode": barcode,
+        "name": name,
+        "ingredients": ["oats"],
+        "certifications": [],
+        "source": source,
+        "created_at": NOW - timedelta(minutes=minutes_ago),
+    }
+
+def cache_entry(barcode, name, certifications=None, **fields):
+    entry = {
+        "barcode": barcode,
+        "product_info": {"name": name, "brand": fields.get("brand"), "ingredients": ["oats"], "image_url": None,
+                         "source": "OpenFoodFacts"},
+    }
+    if certifications is not None:
+        entry["certifications"] = certifications
+    return entry
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+def build(db, tmp_path, limit=None) -> ProductCatalog:
+    path = tmp_path / "catalog.bin"
+    build_catalog_from_products(db, str(path), limit)
+    return ProductCatalog(str(path))
+
+def test_catalog_copies_product_cache_entry(db, tmp_path):
+    db.products.insert_many([scan("0012345", "Old Name", 10), scan("0012345", "Rolled Oats", 1)])
+    db.product_cache.insert_one(cache_entry("0012345", "Rolled Oats", ["Organic"], brand="Acme"))
+
+    catalog = build(db, tmp_path)
+
+    assert catalog.get("0012345") == {
+        "name": "Rolled Oats", "brand": "Acme", "ingredients": ["oats"], "image_url": None,
+        "certifications": ["Organic"], "source": "Catalog",
+    }
+    catalog.close()
+
+def test_rebuild_picks_up_refreshed_cache_entry(db, tmp_path):
+    db.products.insert_one(scan("0012345", "Rolled Oats", 10))
+    db.product_cache.insert_one(cache_entry("0012345", "Rolled Oats", []))
+    build(db, tmp_path).close()
+
+    # Scans served from the catalog, then a refresh of the cache entry
+    db.products.insert_many([scan("0012345", "Rolled Oats", minutes, source="Catalog") for minutes in range(3)])
+    db.product_cache.update_one(
+        {"barcode": "0012345"},
+        {"$set": {"product_info.name": "Organic Rolled Oats", "certifications": ["USDA Organic"]}}
+    )
+
+    catalog = build(db, tmp_path)
+
+    assert catalog.get("0012345")["name"] == "Organic Rolled Oats"
+    assert catalog.get("0012345")["certifications"] == ["USDA Organic"]
+    catalog.close()
+
+def test_missing_certifications_stay_unset(db, tmp_path):
+    db.products.insert_one(scan("0012345", "Rolled Oats", 1))
+    db.product_cache.insert_one(cache_entry("0012345", "Rolled Oats"))
+
+    catalog = build(db, tmp_path)
+
+    # Computed on scan rather than served as "none"
+    assert catalog.get("0012345")["certifications"] is None
+    catalog.close()
+
+def test_catalog_skips_barcodes_without_cache_entry(db, tmp_path):
+    db.products.insert_many([
+        scan("0012345", "Rolled Oats", 10),
+        # Never found, so only a placeholder was saved
+        scan("0099999", "Product 0099999", 1, source="Generated"),
+    ])
+    db.product_cache.insert_one(cache_entry("0012345", "Rolled Oats"))
+
+    catalog = build(db, tmp_path)
+
+    assert catalog.count == 1
+    assert catalog.get("0099999") is None
+    catalog.close()
+
+def test_catalog_limit_keeps_most_scanned_barcodes(db, tmp_path):
+    db.products.insert_many(
+        [scan("0011111", "Popular", minutes, source="Catalog") for minutes in range(3)]
+        + [scan("0022222", "Rare", 1)]
+    )
+    db.product_cache.insert_many([cache_entry("0011111", "Popular"), cache_entry("0022222", "Rare")])
+
+    catalog = build(db, tmp_path, limit=1)
+
+    assert catalog.count == 1
+    assert catalog.get("0011111")["name"] == "Popular"
+    catalog.close()
+
+def test_write_catalog_keeps_first_record_for_duplicate_barcodes(tmp_path):
+    path = str(tmp_path / "catalog.bin")
+
+    count = write_catalog(path, [("0012345", {"name": "First"}), ("12345", {"name": "Second"}), ("abc", {"name": "Bad"})])
+
+    catalog = ProductCatalog(path)
+    assert count == 1
+    assert catalog.get("00012345")["name"] == "First"
+    catalog.close()
@@ -0,0 +1,188 @@
+import csv
+import gzip
+import json
+import zipfile
+
+import pytest
+
+import local_store
+from local_store import LocalProductStore, import_openfoodfacts_dump
+
+class Interrupted(Exception):
+    """Stands in for a crash or Ctrl-C partway through an import"""
+
+def interrupt_after(monkeypatch, name: str, rows: int) -> None:
+    """Make local_store.<name> raise Interrupted after yielding `rows` rows"""
+    original = getattr(local_store, name)
+
+    def interrupted(*args, **kwargs):
+        for index, row in enumerate(original(*args, **kwargs)):
+            if index == rows:
+                raise Interrupted()
+            yield row
+
+    monkeypatch.setattr(local_store, name, interrupted)
+
+def table(store: LocalProductStore, name: str) -> dict:
+    return dict(store.conn.execute(f"SELECT * FROM {name}").fetchall())
+
+OPENFOODFACTS_PRODUCTS = [
+    {"code": f"00{index:011d}", "product_name": f"Product {index}", "brands": "Acme,Acme Foods",
+     "ingredients_text": "oats, honey", "labels": "Organic"}
+    for index in range(1, 12)
+]
+
+def write_jsonl_gz(path):
+    with gzip.open(path, "wt", encoding="utf-8") as handle:
+        for index, product in enumerate(OPENFOODFACTS_PRODUCTS):
+            handle.write(json.dumps(product) + "\n")
+            if index == 4:
+                handle.write("{not json\n")
+            if index == 7:
+                handle.write(json.dumps({"product_name": "No barcode"}) + "\n")
+    return path
+
+def write_tsv(path):
+    fields = ["code", "product_name", "brands", "ingredients_text", "labels"]
+    lines = ["\t".join(fields)] + [
+        "\t".join(product[field] for field in fields) for product in OPENFOODFACTS_PRODUCTS
+    ]
+    path.write_text("\n".join(lines) + "\n", encoding="utf-8")
+    return path
+
+@pytest.fixture(params=["jsonl.gz", "tsv"])
+def dump(request, tmp_path):
+    if request.param == "jsonl.gz":
+        return write_jsonl_gz(tmp_path / "products.jsonl.gz")
+    return write_tsv(tmp_path / "products.csv")
+
+def test_openfoodfacts_import_maps_records(dump, tmp_path):
+    store = LocalProductStore(tmp_path / "store.db")
+
+    result = import_openfoodfacts_dump(store, str(dump), batch_size=3)
+
+    assert result["rows_imported"] == len(OPENFOODFACTS_PRODUCTS)
+    assert store.get_openfoodfacts("0000000000001") == {
+        "name": "Product 1", "brand": "Acme", "ingredients": ["oats", "honey"], "image_url": None,
+        "ingredients_text": "oats, honey", "labels": "Organic", "source": "OpenFoodFacts",
+    }
+    # UPC-A and EAN-13 forms of a barcode share a key
+    assert store.get_openfoodfacts("000000000002") == store.get_openfoodfacts("0000000000002")
+    store.close()
+
+def test_openfoodfacts_import_resumes_after_interruption(dump, tmp_path, monkeypatch):
+    clean = LocalProductStore(tmp_path / "clean.db")
+    expected = import_openfoodfacts_dump(clean, str(dump), batch_size=3)
+
+    store = LocalProductStore(tmp_path / "store.db")
+    with monkeypatch.context() as patch:
+        interrupt_after(patch, "iter_openfoodfacts_dump", 7)
+        with pytest.raises(Interrupted):
+            import_openfoodfacts_dump(store, str(dump), batch_size=3)
+
+    # Only whole batches were committed; the partial one is re-read
+    progress = store.get_progress("openfoodfacts")
+    assert progress["rows_read"] == 6
+    assert not progress["completed"]
+    assert store.count("openfoodfacts_products") == progress["rows_imported"]
+
+    resumed = import_openfoodfacts_dump(store, str(dump), batch_size=3)
+
+    assert resumed["rows_read"] == expected["rows_read"]
+    assert resumed["rows_imported"] == expected["rows_imported"]
+    assert table(store, "openfoodfacts_products") == table(clean, "openfoodfacts_products")
+    clean.close()
+    store.close()
+
+def test_completed_import_is_not_repeated_unless_restarted(dump, tmp_path):
+    store = LocalProductStore(tmp_path / "store.db")
+    import_openfoodfacts_dump(store, str(dump), batch_size=3)
+
+    assert import_openfoodfacts_dump(store, str(dump), batch_size=3) is None
+
+    restarted = import_openfoodfacts_dump(store, str(dump), batch_size=3, restart=True)
+    assert restarted["rows_imported"] == len(OPENFOODFACTS_PRODUCTS)
+    store.close()
+
+FDC_FOODS = [
+    {"fdc_id": str(1000 + index), "data_type": "branded_food", "description": f"FOOD {index}",
+     "publication_date": "2024-10-31"}
+    for index in range(1, 9)
+] + [{"fdc_id": "5", "data_type": "foundation_food", "description": "OATS", "publication_date": "2020-01-01"}]
+
+FDC_BRANDED = [
+    {"fdc_id": str(1000 + index), "brand_owner": "Acme" if index % 2 else "", "market_country": "United States",
+     "gtin_upc": f"0{index:011d}", "ingredients": "OATS, HONEY"}
+    for index in range(1, 9)
+]
+
+def write_csv(path, rows):
+    with open(path, "w", newline="", encoding="utf-8") as handle:
+        writer = csv.DictWriter(handle, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+
+@pytest.fixture(params=["directory", "zip"])
+def fdc_download(request, tmp_path):
+    directory = tmp_path / "FoodData_Central_branded_food_csv"
+    directory.mkdir()
+    write_csv(directory / "food.csv", FDC_FOODS)
+    write_csv(directory / "branded_food.csv", FDC_BRANDED)
+    if request.param == "directory":
+        return directory
+    archive = tmp_path / "FoodData_Central_branded_food_csv.zip"
+    with zipfile.ZipFile(archive, "w") as handle:
+        for name in ("food.csv", "branded_food.csv"):
+            handle.write(directory / name, f"FoodData_Central_branded_food_csv/{name}")
+    return archive
+
+def test_fdc_import_joins_descriptions_by_fdc_id(fdc_download, tmp_path):
+    store = LocalProductStore(tmp_path / "store.db")
+
+    result = local_store.import_fdc_branded_foods(store, str(fdc_download), batch_size=3)
+
+    assert result["products"] == len(FDC_BRANDED)
+    assert store.get_fdc_branded("000000000001") == {
+        "name": "FOOD 1", "brand": "Acme", "ingredients": ["OATS", "HONEY"], "ingredients_text": "OATS, HONEY",
+        "fdc_id": 1001, "data_type": "Branded", "upc_match": True, "publication_date": "2024-10-31",
+        "source": "USDA FoodData Central",
+    }
+    assert store.get_fdc_branded("0000000000002")["brand"] == "United States"
+    # The staging table is emptied once the join is done
+    assert store.count("fdc_food_descriptions") == 0
+    store.close()
+
+STAGE_FILES = {"fdc_food": "food.csv", "fdc_branded_food": "branded_food.csv"}
+
+@pytest.mark.parametrize("stage_rows", [("fdc_food", 4), ("fdc_branded_food", 5)])
+def test_fdc_import_resumes_after_interruption(fdc_download, tmp_path, monkeypatch, stage_rows):
+    stage, rows = stage_rows
+    clean = LocalProductStore(tmp_path / "clean.db")
+    local_store.import_fdc_branded_foods(clean, str(fdc_download), batch_size=3)
+
+    original = local_store.iter_fdc_csv
+
+    def iter_fdc_csv(path, filename, skip=0):
+        for index, row in enumerate(original(path, filename, skip)):
+            if filename == STAGE_FILES[stage] and index == rows:
+                raise Interrupted()
+            yield row
+
+    store = LocalProductStore(tmp_path / "store.db")
+    with monkeypatch.context() as patch:
+        patch.setattr(local_store, "iter_fdc_csv", iter_fdc_csv)
+        with pytest.raises(Interrupted):
+            local_store.import_fdc_branded_foods(store, str(fdc_download), batch_size=3)
+
+    progress = store.get_progress(stage)
+    assert progress["rows_read"] == 3
+    assert not progress["completed"]
+
+    result = local_store.import_fdc_branded_foods(store, str(fdc_download), batch_size=3)
+
+    assert result["products"] == len(FDC_BRANDED)
+    assert table(store, "fdc_branded_foods") == table(clean, "fdc_branded_foods")
+    assert store.get_progress("fdc_food")["rows_read"] == len(FDC_FOODS)
+    assert store.get_progress("fdc_branded_food")["rows_read"] == len(FDC_BRANDED)
+    clean.close()
+    store.close()
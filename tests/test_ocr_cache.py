@@ -0,0 +1,51 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+import server
+from server import OCRResultCache
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+RESULT = {"text": "INGREDIENTS: OATS", "ingredients": ["OATS"], "lines": [12.0]}
+
+@pytest.fixture
+def cache(monkeypatch):
+    monkeypatch.setattr(server, "db", mongomock_motor.AsyncMongoMockClient().db)
+    monkeypatch.setattr(server, "OCR_CACHE_TTL_SECONDS", 3600)
+    return OCRResultCache("ocr_cache", {"mode": "test"})
+
+def persist(cache, key, age_seconds):
+    async def insert():
+        await cache.collection.insert_one({
+            "key": key, "settings": cache.settings_id, "phash": None, **RESULT,
+            "created_at": datetime.utcnow() - timedelta(seconds=age_seconds)
+        })
+    asyncio.run(insert())
+
+def test_database_entries_past_ttl_are_misses(cache):
+    persist(cache, "fresh", 60)
+    persist(cache, "expired", 7200)
+
+    assert asyncio.run(cache.get("fresh")) == RESULT
+    assert asyncio.run(cache.get("expired")) is None
+    assert cache.counters["db_hits"] == 1
+
+def test_load_skips_expired_entries(cache):
+    persist(cache, "fresh", 60)
+    persist(cache, "expired", 7200)
+
+    assert asyncio.run(cache.load()) == 1
+    assert cache.memory.get("fresh") == (True, RESULT)
+    assert cache.memory.get("expired") == (False, None)
+
+def test_loaded_entries_keep_only_their_remaining_ttl(cache):
+    persist(cache, "old", 3600 - 0.2)
+
+    asyncio.run(cache.load())
+    assert cache.memory.get("old") == (True, RESULT)
+
+    time.sleep(0.3)
+    assert cache.memory.get("old") == (False, None)
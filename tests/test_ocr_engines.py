@@ -0,0 +1,48 @@
+import numpy as np
+
+from ocr_engines import EasyOCREngine, pad_to_common_size
+
+class StubReader:
+    """Records batches and checks them the way easyocr's reformat_input_batched does"""
+
+    def __init__(self):
+        self.batches = []
+
+    def readtext_batched(self, images, batch_size=1):
+        assert isinstance(images, list) or (isinstance(images, np.ndarray) and images.ndim == 4)
+        for image in images:
+            assert image.ndim == 2 or (image.ndim == 3 and image.shape[2] in (1, 3, 4))
+        self.batches.append(images)
+        return [[([[0, 0], [10, 0], [10, 5], [0, 5]], f"text {index}", 0.9)] for index in range(len(images))]
+
+def stub_engine() -> EasyOCREngine:
+    engine = EasyOCREngine.__new__(EasyOCREngine)
+    engine.reader = StubReader()
+    return engine
+
+def test_grayscale_batch_is_passed_as_list_of_padded_images():
+    engine = stub_engine()
+    images = [np.zeros((1600, 1200), dtype=np.uint8), np.zeros((900, 1600), dtype=np.uint8)]
+
+    results = engine.readtext_batch(images)
+
+    batch = engine.reader.batches[0]
+    assert len(batch) == 2
+    assert [image.shape for image in batch] == [(1600, 1600), (1600, 1600)]
+    assert [result[0][1] for result in results] == ["text 0", "text 1"]
+
+def test_color_batch_keeps_channels():
+    engine = stub_engine()
+    images = [np.zeros((40, 60, 3), dtype=np.uint8), np.zeros((50, 30, 3), dtype=np.uint8)]
+
+    engine.readtext_batch(images)
+
+    assert [image.shape for image in engine.reader.batches[0]] == [(50, 60, 3), (50, 60, 3)]
+
+def test_padding_is_white_and_keeps_image_at_origin():
+    image = np.zeros((2, 3), dtype=np.uint8)
+    batch = pad_to_common_size([image, np.zeros((4, 2), dtype=np.uint8)])
+
+    assert batch.shape == (2, 4, 3)
+    assert (batch[0, :2, :3] == 0).all()
+    assert (batch[0, 2:, :] == 255).all()
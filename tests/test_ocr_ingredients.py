@@ -0,0 +1,122 @@
+import numpy as np
+import pytest
+
+import ocr
+from ocr import ingredient_block, readtext_ingredients
+from ocr_engines import EasyOCREngine
+
+def corners(box):
+    x_min, x_max, y_min, y_max = box
+    return [[x_min, y_min], [x_max, y_min], [x_max, y_max], [x_min, y_max]]
+
+class StubReader:
+    """Mimics easyocr's detect/recognize split over a fixed label layout
+
+    `label` maps [x_min, x_max, y_min, y_max] boxes to their text. Like
+    easyocr, detect() returns per-image lists of horizontal boxes and free
+    polygons, and recognize() returns (corners, text, confidence) per box
+    sorted by top edge, with corners at the box's (clipped) integer
+    coordinates. A crop covering only the start of a box reads as the
+    matching share of its text.
+    """
+
+    def __init__(self, label, free=()):
+        self.label = {tuple(box): text for box, text in label}
+        self.free = list(free)
+        self.recognized = []
+
+    def detect(self, image):
+        return [[list(box) for box in self.label]], [self.free]
+
+    def text_for(self, box):
+        for (x_min, x_max, y_min, y_max), text in self.label.items():
+            if (box[0], box[2], box[3]) == (x_min, y_min, y_max):
+                return text[:round(len(text) * (box[1] - box[0]) / (x_max - x_min))]
+        raise AssertionError(f"recognize() got a box detect() never returned: {box}")
+
+    def recognize(self, image, horizontal_list=None, free_list=None):
+        assert image.ndim in (2, 3)
+        self.recognized.append((horizontal_list, free_list))
+        results = [(corners(box), self.text_for(box), 0.9) for box in horizontal_list]
+        results += [(polygon, "free text", 0.5) for polygon in free_list]
+        return sorted(results, key=lambda result: result[0][0][1])
+
+@pytest.fixture
+def reader(monkeypatch):
+    def use(label, free=()):
+        engine = EasyOCREngine.__new__(EasyOCREngine)
+        engine.reader = StubReader(label, free)
+        monkeypatch.setattr(ocr, "_engine", engine)
+        return engine.reader
+    return use
+
+IMAGE = np.full((400, 1000), 255, dtype=np.uint8)
+
+SEAL = ([10, 130, 0, 20], "USDA ORGANIC")
+TITLE = ([10, 400, 30, 50], "Made with organic ingredients")
+ANCHOR = ([10, 300, 100, 120], "Ingredients: whole grain oats,")
+REST_OF_LINE = ([310, 420, 102, 121], "honey, salt,")
+NUTRITION = ([600, 900, 100, 120], "Nutrition Facts")
+CONTINUATION = ([10, 280, 125, 145], "vitamin e (tocopherols)")
+CALORIES = ([600, 800, 125, 145], "Calories 150")
+DISTRIBUTOR = ([10, 350, 200, 220], "Distributed by Acme Foods")
+
+LABEL = [SEAL, TITLE, ANCHOR, REST_OF_LINE, NUTRITION, CONTINUATION, CALORIES, DISTRIBUTOR]
+
+def texts(results):
+    return [result[1] for result in results]
+
+def test_recognizes_only_seals_and_the_ingredient_block(reader):
+    stub = reader(LABEL)
+
+    results = readtext_ingredients(IMAGE)
+
+    assert texts(results) == [
+        "USDA ORGANIC",
+        "Ingredients: whole grain oats,", "honey, salt,", "vitamin e (tocopherols)",
+    ]
+    # One probe pass over every box, then one pass over the block
+    probes, block = stub.recognized[0][0], stub.recognized[1][0]
+    assert len(probes) == len(LABEL)
+    assert probes[1] == [10, 170, 30, 50]
+    assert block == [ANCHOR[0], REST_OF_LINE[0], CONTINUATION[0]]
+    assert all(isinstance(value, float) for value in results[0][0][0])
+
+def test_anchor_is_read_from_the_start_of_a_box(reader):
+    # The title mentions "ingredients" past its probe, so the anchor is the
+    # topmost box that starts with it
+    reader([TITLE, ANCHOR, ([10, 200, 300, 320], "Ingredients may vary")])
+
+    assert texts(readtext_ingredients(IMAGE))[0] == "Ingredients: whole grain oats,"
+
+def test_anchor_tolerates_ocr_slips(reader):
+    reader([([10, 300, 100, 120], "1ngredlents: oats")])
+
+    assert texts(readtext_ingredients(IMAGE)) == ["1ngredlents: oats"]
+
+def test_without_anchor_every_box_is_recognized(reader):
+    free = [[[500, 300], [600, 310], [595, 330], [495, 320]]]
+    stub = reader([TITLE, DISTRIBUTOR], free)
+
+    results = readtext_ingredients(IMAGE)
+
+    assert texts(results) == ["Made with organic ingredients", "Distributed by Acme Foods", "free text"]
+    assert stub.recognized[-1] == ([TITLE[0], DISTRIBUTOR[0]], free)
+
+def test_no_boxes_recognizes_free_text_only(reader):
+    free = [[[500, 300], [600, 310], [595, 330], [495, 320]]]
+    reader([], free)
+
+    assert texts(readtext_ingredients(IMAGE)) == ["free text"]
+
+def test_block_continues_across_wrapped_lines_but_not_into_the_next_column():
+    boxes = [box for box, _ in LABEL]
+
+    block = ingredient_block(boxes, LABEL.index(ANCHOR))
+
+    assert sorted(block) == [LABEL.index(box) for box in (ANCHOR, REST_OF_LINE, CONTINUATION)]
+
+def test_block_ends_at_a_vertical_gap():
+    boxes = [[10, 300, 100, 120], [10, 300, 125, 145], [10, 300, 150, 170], [10, 300, 200, 220]]
+
+    assert ingredient_block(boxes, 0) == [0, 1, 2]
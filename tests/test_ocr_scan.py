@@ -0,0 +1,154 @@
+import asyncio
+import io
+
+import pytest
+from fastapi import UploadFile
+from PIL import Image
+
+import server
+from ocr import OCRPool, OCRQueueFull
+
+mongomock_motor = pytest.importorskip("mongomock_motor")
+
+def png(color) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8), color).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+class StubBatcher:
+    """Stands in for OCRBatcher; each image "runs" instantly and frees its slot"""
+
+    def __init__(self, pool: OCRPool):
+        self.pool = pool
+        self.images = []
+        self.in_flight_seen = []
+        # Cleared to hold images "in the workers" until set
+        self.gate = None
+
+    async def recognize(self, data, reserved=False):
+        assert reserved
+        self.images.append(data)
+        self.in_flight_seen.append(self.pool.in_flight)
+        await asyncio.sleep(0)
+        if self.gate is not None:
+            await self.gate.wait()
+        self.pool.release()
+        return [([[0, 0], [40, 0], [40, 10], [0, 10]], "INGREDIENTS: OATS, HONEY", 0.9)]
+
+@pytest.fixture
+def ocr(monkeypatch):
+    """A two-slot OCR pool (one worker, one queued job) with a stub batcher"""
+    pool = OCRPool(1, 1, ["en"], warmup=False)
+    batcher = StubBatcher(pool)
+
+    async def enhanced_certification_detection(product_name, brand=None, text="", timeout=None):
+        return [], True
+
+    monkeypatch.setattr(server, "db", mongomock_motor.AsyncMongoMockClient().db)
+    monkeypatch.setattr(server, "OCR_AVAILABLE", True)
+    monkeypatch.setattr(server, "ocr_pool", pool)
+    monkeypatch.setattr(server, "ocr_batcher", batcher)
+    monkeypatch.setattr(server, "enhanced_certification_detection", enhanced_certification_detection)
+    server.ocr_result_cache.memory.clear()
+    server.ocr_result_cache.perceptual.clear()
+    yield pool, batcher
+    server.ocr_result_cache.memory.clear()
+    pool.shutdown()
+
+def test_scan_reserves_a_slot_per_image_up_front(ocr):
+    pool, batcher = ocr
+
+    result = asyncio.run(server.process_ocr_scan("session", [png("red"), png("blue")]))
+
+    assert result.product.ingredients == ["oats", "honey"]
+    # Both slots were held before the first image ran
+    assert batcher.in_flight_seen[0] == 2
+    assert pool.in_flight == 0
+
+def test_scan_larger_than_free_slots_is_rejected_before_any_ocr(ocr):
+    pool, batcher = ocr
+
+    with pytest.raises(OCRQueueFull):
+        asyncio.run(server.process_ocr_scan("session", [png("red"), png("green"), png("blue")]))
+
+    assert batcher.images == []
+    assert pool.in_flight == 0
+
+def test_cached_images_release_their_slot(ocr):
+    pool, batcher = ocr
+    asyncio.run(server.process_ocr_scan("session", [png("red")]))
+
+    asyncio.run(server.process_ocr_scan("session", [png("red"), png("blue")]))
+
+    assert len(batcher.images) == 2
+    assert pool.in_flight == 0
+
+def test_max_images_is_validated_against_pool_capacity(monkeypatch):
+    monkeypatch.setattr(server, "OCR_ENGINE_AVAILABLE", True)
+    monkeypatch.setattr(server, "OCR_WORKERS", 1)
+    monkeypatch.setattr(server, "OCR_QUEUE_SIZE", 2)
+    monkeypatch.setattr(server, "OCR_MAX_IMAGES", 4)
+
+    with pytest.raises(RuntimeError, match="OCR_MAX_IMAGES"):
+        asyncio.run(server.start_ocr_pool())
+
+STAGES = ["decoded", "ocr_done", "ingredients_extracted", "certifications_done"]
+
+def upload(data: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(data), filename="label.png")
+
+def test_burst_of_jobs_queues_for_the_pool_instead_of_failing(ocr, monkeypatch):
+    pool, batcher = ocr
+    monkeypatch.setattr(server, "ocr_job_tasks", {})
+
+    async def scenario():
+        batcher.gate = asyncio.Event()
+        accepted = [
+            await server.create_ocr_job(session_id="session", image=upload(png((index, 0, 0))))
+            for index in range(4)
+        ]
+        tasks = list(server.ocr_job_tasks.values())
+
+        async def settled():
+            while len(batcher.images) < pool.capacity or pool.waiting < 2:
+                await asyncio.sleep(0.01)
+
+        # Two jobs hold the pool; the others wait for a slot
+        await asyncio.wait_for(settled(), 1.0)
+        assert pool.in_flight == pool.capacity
+        assert len(batcher.images) == pool.capacity
+
+        batcher.gate.set()
+        await asyncio.wait_for(asyncio.gather(*tasks), 1.0)
+        return [await server.get_ocr_job(job["id"]) for job in accepted]
+
+    jobs = asyncio.run(scenario())
+
+    assert [job["status"] for job in jobs] == ["completed"] * 4
+    assert all([stage["stage"] for stage in job["stages"]] == STAGES for job in jobs)
+    assert jobs[0]["result"]["product"]["ingredients"] == ["oats", "honey"]
+    assert pool.in_flight == 0
+
+def test_job_events_stream_each_stage_then_the_result(ocr, monkeypatch):
+    _, batcher = ocr
+    monkeypatch.setattr(server, "ocr_job_tasks", {})
+    monkeypatch.setattr(server, "OCR_JOB_EVENT_POLL_SECONDS", 0.05)
+
+    async def scenario():
+        batcher.gate = asyncio.Event()
+        accepted = await server.create_ocr_job(session_id="session", image=upload(png("red")))
+        job = await server.get_ocr_job_document(accepted["id"])
+
+        async def collect():
+            return [event async for event in server.ocr_job_events(accepted["id"], job)]
+
+        stream = asyncio.create_task(collect())
+        await asyncio.sleep(0.1)
+        batcher.gate.set()
+        return await asyncio.wait_for(stream, 1.0)
+
+    events = [event for event in asyncio.run(scenario()) if not event.startswith(b":")]
+
+    names = [event.split(b"\n")[0] for event in events]
+    assert names == [b"event: stage"] * 4 + [b"event: completed"]
+    assert [server.fastjson.loads(event.split(b"data: ")[1])["stage"] for event in events[:4]] == STAGES
@@ -0,0 +1,73 @@
+import asyncio
+
+import pytest
+
+import server
+from organic_index import OrganicIndex, normalize_operation_name
+
+OPERATIONS = [
+    "Peanut Butter & Co",
+    "Whole Milk Dairy Farm",
+    "Apple Cider Orchards LLC",
+    "Annie's Homegrown Organic",
+    "Nature's Path Foods, Inc.",
+]
+
+@pytest.fixture
+def index() -> OrganicIndex:
+    return OrganicIndex(normalize_operation_name(name) for name in OPERATIONS)
+
+def test_normalization_drops_suffixes_accents_and_punctuation():
+    assert normalize_operation_name("Nature's Path Foods, Inc.") == "natures path foods"
+    assert normalize_operation_name("Café Ñandú & Co") == "cafe nandu and"
+
+def test_exact_match(index):
+    assert index.match("Natures Path Foods Inc") == ("natures path foods", 1.0)
+    assert index.match("Natures Path Foods", exact=True) == ("natures path foods", 1.0)
+
+def test_brand_prefix_match(index):
+    assert index.match("Annie's Homegrown") == ("annies homegrown organic", 0.95)
+
+def test_brand_fuzzy_match(index):
+    match = index.match("Natures Path Food")
+    assert match is not None
+    assert match[0] == "natures path foods"
+
+def test_unrelated_term_does_not_match(index):
+    assert index.match("Kellogg") is None
+    assert index.match("") is None
+
+@pytest.mark.parametrize("product_name", ["Peanut Butter", "Whole Milk", "apple cider", "Natures Path"])
+def test_generic_product_names_do_not_match_exactly(index, product_name):
+    assert index.match(product_name, exact=True) is None
+
+@pytest.fixture
+def certification_lookup(monkeypatch, index):
+    monkeypatch.setattr(server, "organic_index", index)
+    monkeypatch.setattr(server, "ORGANIC_INDEX_REMOTE_FALLBACK", False)
+    server.organic_certification_cache.clear()
+    yield lambda name, brand=None: asyncio.run(server.lookup_usda_organic_certification(name, brand))
+    server.organic_certification_cache.clear()
+
+@pytest.mark.parametrize("product_name", ["Peanut Butter", "Whole Milk", "Apple Cider"])
+def test_generic_product_names_are_not_certified(certification_lookup, product_name):
+    assert certification_lookup(product_name) == []
+
+def test_product_name_without_certified_brand_is_not_certified(certification_lookup):
+    assert certification_lookup("Peanut Butter", "Store Brand") == []
+
+def test_certified_brand_matches_by_prefix(certification_lookup):
+    assert certification_lookup("Creamy Peanut Butter", "Annie's Homegrown") == ["USDA Organic"]
+
+def test_certified_brand_matches_exactly(certification_lookup):
+    assert certification_lookup("Crunchy Peanut Butter", "Peanut Butter & Co.") == ["USDA Organic"]
+
+def test_certification_stage_reports_whether_usda_answered(certification_lookup, monkeypatch):
+    detect = lambda: asyncio.run(server.enhanced_certification_detection("Rolled Oats", text="organic oats"))
+    assert detect() == (["Organic"], True)
+
+    async def unavailable(product_name, brand=None):
+        raise server.UpstreamUnavailable("usda_organic circuit is open")
+
+    monkeypatch.setattr(server, "lookup_usda_organic_certification", unavailable)
+    assert detect() == (["Organic"], False)
@@ -0,0 +1,127 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import server
+from server import PRIORITY_BACKGROUND, PRIORITY_INTERACTIVE, RateLimiter, UpstreamUnavailable
+
+def test_burst_is_granted_immediately():
+    limiter = RateLimiter("test", per_hour=36, burst=3)
+
+    async def scenario():
+        for _ in range(3):
+            await asyncio.wait_for(limiter.acquire(PRIORITY_INTERACTIVE), 0.01)
+
+    asyncio.run(scenario())
+
+    assert limiter.stats()["by_priority"]["interactive"]["granted"] == 3
+    assert limiter.tokens < 1
+
+def test_interactive_waiters_are_served_before_background():
+    # 20 tokens per second, one at a time
+    limiter = RateLimiter("test", per_hour=20 * 3600, burst=1)
+    order = []
+
+    async def take(priority, name):
+        await limiter.acquire(priority)
+        order.append(name)
+
+    async def scenario():
+        await limiter.acquire(PRIORITY_INTERACTIVE)
+        # Background calls queue first, interactive ones still go ahead of them
+        await asyncio.gather(
+            take(PRIORITY_BACKGROUND, "background 1"),
+            take(PRIORITY_BACKGROUND, "background 2"),
+            take(PRIORITY_INTERACTIVE, "interactive 1"),
+            take(PRIORITY_INTERACTIVE, "interactive 2"),
+        )
+
+    asyncio.run(scenario())
+
+    assert order == ["interactive 1", "interactive 2", "background 1", "background 2"]
+
+def test_wait_budget_exhaustion_rejects(monkeypatch):
+    monkeypatch.setattr(server, "RATE_LIMIT_INTERACTIVE_MAX_WAIT", 0.05)
+    # One token every 100 seconds
+    limiter = RateLimiter("test", per_hour=36, burst=1)
+
+    async def scenario():
+        await limiter.acquire(PRIORITY_INTERACTIVE)
+        started = time.monotonic()
+        with pytest.raises(UpstreamUnavailable):
+            await limiter.acquire(PRIORITY_INTERACTIVE)
+        return time.monotonic() - started
+
+    waited = asyncio.run(scenario())
+
+    assert 0.04 <= waited < 0.5
+    stats = limiter.stats()
+    assert stats["by_priority"]["interactive"]["rejected"] == 1
+    assert stats["queue_depth"] == 0
+
+def test_refill_is_capped_at_burst():
+    limiter = RateLimiter("test", per_hour=3600, burst=5)
+    limiter.tokens = 0.0
+    limiter.updated = time.monotonic() - 100
+
+    limiter._refill()
+
+    assert limiter.tokens == 5
+
+def test_no_refill_while_paused():
+    limiter = RateLimiter("test", per_hour=3600, burst=5)
+    limiter.pause(10)
+    limiter.updated = time.monotonic() - 100
+
+    limiter._refill()
+
+    assert limiter.tokens == 0.0
+    assert 9 < limiter.stats()["paused_seconds"] <= 10
+
+def test_refill_after_pause_counts_from_pause_end():
+    # One token per second
+    limiter = RateLimiter("test", per_hour=3600, burst=5)
+    now = time.monotonic()
+    limiter.tokens = 0.0
+    limiter.updated = now - 5
+    limiter.paused_until = now - 1
+
+    limiter._refill()
+
+    # Only the second since the pause ended counts, not the five since the last update
+    assert 1.0 <= limiter.tokens < 1.1
+
+def test_waiters_are_held_until_pause_ends():
+    # Ten tokens per second
+    limiter = RateLimiter("test", per_hour=10 * 3600, burst=1)
+
+    async def scenario():
+        limiter.pause(0.2)
+        started = time.monotonic()
+        await limiter.acquire(PRIORITY_BACKGROUND)
+        return time.monotonic() - started
+
+    waited = asyncio.run(scenario())
+
+    # The pause, then one token's refill time
+    assert 0.25 <= waited < 0.6
+
+def test_429_pauses_limiter_for_retry_after(monkeypatch):
+    limiter = RateLimiter("openfoodfacts", per_hour=3600, burst=5)
+    monkeypatch.setattr(server, "rate_limiters", {"openfoodfacts": limiter})
+    monkeypatch.setattr(server, "circuit_breakers", {"openfoodfacts": server.CircuitBreaker("openfoodfacts")})
+
+    class RateLimitedClient:
+        async def get(self, url, **kwargs):
+            return httpx.Response(429, headers={"Retry-After": "30"})
+
+    monkeypatch.setattr(server, "get_upstream_client", lambda upstream: RateLimitedClient())
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(server.upstream_get("openfoodfacts", "https://example.test"))
+
+    stats = limiter.stats()
+    assert stats["tokens"] == 0
+    assert 29 < stats["paused_seconds"] <= 30
@@ -0,0 +1,260 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+import server
+from server import CircuitBreaker, Deadline, UpstreamUnavailable
+
+class FakeClient:
+    """Stands in for the shared httpx client; each get() runs `handler`"""
+
+    def __init__(self, handler):
+        self.handler = handler
+        self.calls = 0
+
+    async def get(self, url, **kwargs):
+        self.calls += 1
+        return await self.handler(url, **kwargs)
+
+async def hang(url, **kwargs):
+    await asyncio.sleep(3600)
+
+async def server_error(url, **kwargs):
+    return httpx.Response(503)
+
+async def ok(url, **kwargs):
+    return httpx.Response(200, json={})
+
+@pytest.fixture
+def breakers(monkeypatch):
+    fresh = {upstream: CircuitBreaker(upstream) for upstream in server.UPSTREAMS}
+    monkeypatch.setattr(server, "circuit_breakers", fresh)
+    monkeypatch.setattr(server, "rate_limiters", {})
+    return fresh
+
+def use_client(monkeypatch, handler) -> FakeClient:
+    client = FakeClient(handler)
+    monkeypatch.setattr(server, "get_upstream_client", lambda upstream: client)
+    return client
+
+def test_breaker_trips_on_failure_ratio(monkeypatch):
+    monkeypatch.setattr(server, "CIRCUIT_MIN_CALLS", 4)
+    breaker = CircuitBreaker("test")
+    for _ in range(3):
+        breaker.record(False, 0.0)
+    assert breaker.state == "closed"
+
+    breaker.record(False, 0.0)
+
+    assert breaker.state == "open"
+    assert breaker.trips == 1
+    assert not breaker.allow()
+    assert breaker.short_circuited == 1
+
+def test_breaker_trips_on_slow_calls(monkeypatch):
+    monkeypatch.setattr(server, "CIRCUIT_MIN_CALLS", 4)
+    breaker = CircuitBreaker("test")
+    for _ in range(4):
+        breaker.record(True, server.CIRCUIT_SLOW_CALL_SECONDS)
+
+    assert breaker.state == "open"
+    assert breaker.slow_calls == 4
+    assert breaker.failures == 0
+
+def test_breaker_stays_closed_below_failure_ratio(monkeypatch):
+    monkeypatch.setattr(server, "CIRCUIT_MIN_CALLS", 4)
+    breaker = CircuitBreaker("test")
+    for success in (True, True, True, False, True, True):
+        breaker.record(success, 0.0)
+
+    assert breaker.state == "closed"
+
+def test_half_open_probe_closes_or_reopens(monkeypatch):
+    monkeypatch.setattr(server, "CIRCUIT_MIN_CALLS", 1)
+    monkeypatch.setattr(server, "CIRCUIT_OPEN_SECONDS", 0.0)
+    monkeypatch.setattr(server, "CIRCUIT_HALF_OPEN_PROBES", 1)
+    breaker = CircuitBreaker("test")
+    breaker.record(False, 0.0)
+    assert breaker.state == "open"
+
+    # One probe is let through, others wait for its outcome
+    assert breaker.allow()
+    assert breaker.state == "half_open"
+    assert not breaker.allow()
+
+    breaker.record(False, 0.0)
+    assert breaker.state == "open"
+    assert breaker.trips == 2
+
+    assert breaker.allow()
+    breaker.record(True, 0.0)
+    assert breaker.state == "closed"
+    assert breaker.allow()
+
+def test_released_probe_frees_half_open_slot(monkeypatch):
+    monkeypatch.setattr(server, "CIRCUIT_MIN_CALLS", 1)
+    monkeypatch.setattr(server, "CIRCUIT_OPEN_SECONDS", 0.0)
+    breaker = CircuitBreaker("test")
+    breaker.record(False, 0.0)
+    assert breaker.allow()
+
+    breaker.release()
+
+    assert breaker.allow()
+
+def test_deadline_splits_remaining_time():
+    deadline = Deadline(10.0)
+
+    assert 5.9 < deadline.budget(0.6) <= 6.0
+    assert deadline.budget(cap=2.0) == 2.0
+    assert Deadline(-1.0).remaining() == 0.0
+
+def test_deadline_shrinks_as_time_passes():
+    deadline = Deadline(0.2)
+    time.sleep(0.05)
+
+    assert deadline.remaining() < 0.16
+
+def test_cancelled_slow_calls_trip_breaker(monkeypatch, breakers):
+    # Stage budgets cancel calls long before the client's read timeout
+    monkeypatch.setattr(server, "CIRCUIT_SLOW_CALL_SECONDS", 0.02)
+    monkeypatch.setattr(server, "CIRCUIT_MIN_CALLS", 3)
+    client = use_client(monkeypatch, hang)
+
+    async def scenario():
+        for _ in range(3):
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(server.upstream_get("usda_organic", "https://example.test"), 0.05)
+        # Short-circuited without waiting on the hung upstream
+        with pytest.raises(UpstreamUnavailable):
+            await asyncio.wait_for(server.upstream_get("usda_organic", "https://example.test"), 1.0)
+
+    asyncio.run(scenario())
+
+    stats = breakers["usda_organic"].stats()
+    assert stats["state"] == "open"
+    assert stats["slow_calls"] == 3
+    assert stats["short_circuited"] == 1
+    assert client.calls == 3
+
+def test_quickly_cancelled_calls_are_not_recorded(monkeypatch, breakers):
+    client = use_client(monkeypatch, hang)
+
+    async def scenario():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(server.upstream_get("usda_fdc", "https://example.test"), 0.01)
+
+    asyncio.run(scenario())
+
+    assert breakers["usda_fdc"].stats()["calls"] == 0
+    assert client.calls == 1
+
+def test_server_errors_raise_and_count_as_failures(monkeypatch, breakers):
+    use_client(monkeypatch, server_error)
+
+    with pytest.raises(UpstreamUnavailable):
+        asyncio.run(server.upstream_get("openfoodfacts", "https://example.test"))
+
+    assert breakers["openfoodfacts"].stats()["failures"] == 1
+
+def test_successful_call_is_returned(monkeypatch, breakers):
+    use_client(monkeypatch, ok)
+
+    response = asyncio.run(server.upstream_get("openfoodfacts", "https://example.test"))
+
+    assert response.status_code == 200
+    assert breakers["openfoodfacts"].stats() == {
+        "state": "closed", "calls": 1, "failures": 0, "slow_calls": 0, "trips": 0, "short_circuited": 0
+    }
+
+def fake_lookups(monkeypatch, fdc, openfood, fdc_delay=0.0, openfood_delay=0.0):
+    """Replace both upstream lookups; a result that is an exception is raised"""
+    cancelled = []
+
+    def lookup(name, result, delay):
+        async def run(barcode):
+            try:
+                await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                cancelled.append(name)
+                raise
+            if isinstance(result, Exception):
+                raise result
+            return result
+        return run
+
+    monkeypatch.setattr(server, "lookup_fdc_by_barcode", lookup("fdc", fdc, fdc_delay))
+    monkeypatch.setattr(server, "lookup_openfoodfacts_by_barcode", lookup("openfoodfacts", openfood, openfood_delay))
+    return cancelled
+
+FDC_MATCH = {"name": "FDC match", "upc_match": True}
+FDC_UNMATCHED = {"name": "FDC search hit", "upc_match": False}
+OPENFOOD = {"name": "OFF product"}
+
+def test_upc_matched_fdc_record_wins_and_cancels_openfoodfacts(monkeypatch):
+    cancelled = fake_lookups(monkeypatch, FDC_MATCH, OPENFOOD, openfood_delay=10.0)
+
+    started = time.monotonic()
+    result = asyncio.run(server.lookup_product_from_upstreams("0123"))
+
+    assert result == FDC_MATCH
+    assert cancelled == ["openfoodfacts"]
+    assert time.monotonic() - started < 1.0
+
+def test_openfoodfacts_preferred_over_unmatched_fdc(monkeypatch):
+    fake_lookups(monkeypatch, FDC_UNMATCHED, OPENFOOD, fdc_delay=0.01)
+
+    assert asyncio.run(server.lookup_product_from_upstreams("0123")) == OPENFOOD
+
+def test_fdc_gets_grace_period_after_openfoodfacts(monkeypatch):
+    monkeypatch.setattr(server, "LOOKUP_FDC_GRACE_SECONDS", 0.05)
+    cancelled = fake_lookups(monkeypatch, FDC_MATCH, OPENFOOD, fdc_delay=10.0)
+
+    started = time.monotonic()
+    result = asyncio.run(server.lookup_product_from_upstreams("0123"))
+
+    assert result == OPENFOOD
+    assert cancelled == ["fdc"]
+    assert time.monotonic() - started < 1.0
+
+def test_failed_upstream_falls_back_to_the_other(monkeypatch):
+    fake_lookups(monkeypatch, FDC_UNMATCHED, UpstreamUnavailable("openfoodfacts circuit is open"))
+
+    assert asyncio.run(server.lookup_product_from_upstreams("0123")) == FDC_UNMATCHED
+
+def test_timeout_returns_results_so_far(monkeypatch):
+    cancelled = fake_lookups(monkeypatch, FDC_MATCH, OPENFOOD, fdc_delay=10.0, openfood_delay=10.0)
+
+    started = time.monotonic()
+    result = asyncio.run(server.lookup_product_from_upstreams("0123", timeout=0.05))
+
+    assert result is None
+    assert sorted(cancelled) == ["fdc", "openfoodfacts"]
+    assert time.monotonic() - started < 1.0
+
+@pytest.fixture
+def fdc_cache(monkeypatch):
+    monkeypatch.setenv("USDA_FDC_API_KEY", "test-key")
+    server.fooddata_central_cache.clear()
+    yield server.fooddata_central_cache
+    server.fooddata_central_cache.clear()
+
+def test_fdc_barcode_search_queries_and_caches_by_barcode(monkeypatch, breakers, fdc_cache):
+    searches = []
+
+    async def search(url, params=None, **kwargs):
+        searches.append((params["query"], params["dataType"]))
+        return httpx.Response(200, json={"foods": [
+            {"fdcId": 1, "description": "ROLLED OATS", "gtinUpc": "012345678905", "dataType": "Branded"}
+        ]})
+
+    use_client(monkeypatch, search)
+
+    first = asyncio.run(server.lookup_fdc_by_barcode("012345678905"))
+    second = asyncio.run(server.lookup_fdc_by_barcode(" 012345678905 "))
+
+    assert searches == [("012345678905", ["Branded"])]
+    assert first["upc_match"] and second == first
+    assert fdc_cache.hits == 1